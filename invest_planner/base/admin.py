@@ -3,6 +3,7 @@ Admin file to register Models to Django Admin interface
 """
 from django.contrib import admin
 from .models import Tag, Investment, InvestmentTag, Income, IncomeTag, Expense, ExpenseTag, Notification
+from .models import RateObservation, UserFinancialSnapshot
 
 
 admin.site.register(Tag)
@@ -13,3 +14,5 @@ admin.site.register(ExpenseTag)
 admin.site.register(Income)
 admin.site.register(Expense)
 admin.site.register(Notification)
+admin.site.register(RateObservation)
+admin.site.register(UserFinancialSnapshot)
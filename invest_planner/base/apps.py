@@ -10,3 +10,7 @@ class BaseConfig(AppConfig):
     """
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'base'
+
+    def ready(self):
+        # Connects the receivers that keep snapshots, caches and search in sync
+        from . import signals  # noqa: F401 pylint: disable=import-outside-toplevel,unused-import
@@ -0,0 +1,68 @@
+"""
+Backtest dos investimentos contra o CDI/SELIC realizado
+"""
+from datetime import date
+
+import numpy as np
+
+from .projection import project_balances, monthly_rate, total_months
+
+
+def backtest(investment, index, until=None):
+    """Compara o saldo realizado com o projetado mês a mês
+
+    The projection assumes rate_value for the whole horizon. The realised
+    balance uses, for each calendar month, the accumulation of the stored
+    series over that month times rate_percentage. Only months that ended
+    before ``until`` (default today) and are fully covered by the series are
+    replayed.
+
+    Args:
+        investment: Investment (or any object with the same fields)
+        index: RateIndex of the investment's rate_type, or None
+        until: date of the backtest
+
+    Returns:
+        dict: series rate on the starting date, months as 'YYYY-MM',
+        realised and projected balances and the difference at the last
+        replayed month
+    """
+    first = np.datetime64(investment.starting_date.replace(day=1), 'M')
+    elapsed = np.datetime64(until or date.today(), 'M') - first
+    months = max(min(total_months(investment), int(elapsed)), 0)
+    variable = bool(investment.rate_type and investment.rate_percentage)
+    if variable:
+        if index is None or not len(index) or \
+                np.datetime64(index.first_date, 'M') > first:
+            months = 0
+        else:
+            covered = np.datetime64(index.last_date, 'M') - first
+            months = min(months, max(int(covered), 0))
+
+    bounds = (first + np.arange(months + 1)).astype('datetime64[D]')
+    rates = np.full(months, float(investment.return_rate or 0) / 1200)
+    if variable and months:
+        rates += (index.factor_between(bounds[:-1], bounds[1:]) - 1) * \
+            float(investment.rate_percentage) / 100
+
+    growth = np.cumprod(1.0 + rates)
+    realised = growth * (float(investment.starting_amount) + float(
+        investment.additional_contribution) * np.cumsum(1.0 / growth))
+    projected = project_balances(
+        investment.starting_amount, monthly_rate(investment),
+        investment.additional_contribution, months)
+
+    starting_rate = None
+    if index is not None and len(index):
+        starting_rate = index.rate_on(investment.starting_date)
+
+    return {
+        'starting_rate': starting_rate,
+        'months': np.datetime_as_string(bounds[:-1], unit='M').tolist(),
+        'realised': realised.round(2).tolist(),
+        'projected': projected.round(2).tolist(),
+        'realised_final': round(float(realised[-1]), 2) if months else None,
+        'projected_final': round(float(projected[-1]), 2) if months else None,
+        'difference': round(float(realised[-1] - projected[-1]), 2)
+        if months else None,
+    }
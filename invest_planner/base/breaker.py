@@ -0,0 +1,135 @@
+"""
+Circuit breaker para serviços externos
+"""
+import threading
+from time import monotonic
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling the service while the circuit is open
+    """
+
+    def __init__(self, name, retry_in, last_error=None):
+        super().__init__(
+            f"{name} unavailable, retrying in {retry_in:.0f}s"
+            + (f" (last error: {last_error})" if last_error else ""))
+        self.retry_in = retry_in
+        self.last_error = last_error
+
+
+class CircuitBreaker:
+    """
+    Opens after ``failure_threshold`` consecutive failures. While open every
+    call fails at once with CircuitOpenError, which caches the failure for
+    ``reset_timeout`` seconds. After that a single call is let through as a
+    probe (half-open): success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, name, failure_threshold=3, reset_timeout=30.0,
+                 clock=monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Fecha o circuito e zera as métricas
+        """
+        with self._lock:
+            self.state = CLOSED
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self.last_error = None
+            self._probing = False
+            self.calls = 0
+            self.successes = 0
+            self.failures = 0
+            self.rejected = 0
+            self.total_time = 0.0
+            self.last_time = None
+
+    def _retry_in(self):
+        return max(self.opened_at + self.reset_timeout - self._clock(), 0.0)
+
+    def _before_call(self):
+        with self._lock:
+            if self.state == OPEN and self._retry_in() == 0:
+                self.state = HALF_OPEN
+            if self.state == OPEN or (self.state == HALF_OPEN and self._probing):
+                self.rejected += 1
+                raise CircuitOpenError(
+                    self.name, self._retry_in() if self.state == OPEN else 0.0,
+                    self.last_error)
+            if self.state == HALF_OPEN:
+                self._probing = True
+
+    def _after_call(self, elapsed, error=None):
+        with self._lock:
+            self.calls += 1
+            self.total_time += elapsed
+            self.last_time = elapsed
+            self._probing = False
+            if error is None:
+                self.successes += 1
+                self.consecutive_failures = 0
+                self.state = CLOSED
+                self.opened_at = None
+                return
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_error = str(error)
+            if self.state == HALF_OPEN or \
+                    self.consecutive_failures >= self.failure_threshold:
+                self.state = OPEN
+                self.opened_at = self._clock()
+
+    def call(self, function, *args, is_failure=lambda e: True, **kwargs):
+        """Chama function através do circuito
+
+        Exceptions for which ``is_failure`` returns False are re-raised
+        without counting against the service (e.g. bad input).
+
+        Raises:
+            CircuitOpenError: the circuit is open or a probe is already running
+        """
+        self._before_call()
+        start = self._clock()
+        try:
+            result = function(*args, **kwargs)
+        except Exception as e:
+            self._after_call(self._clock() - start, e if is_failure(e) else None)
+            raise
+        except BaseException:
+            with self._lock:
+                self._probing = False
+            raise
+        self._after_call(self._clock() - start)
+        return result
+
+    def stats(self):
+        """Estado atual e métricas de tempo
+        """
+        with self._lock:
+            return {
+                'name': self.name,
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'retry_in': round(self._retry_in(), 3)
+                if self.state == OPEN else None,
+                'last_error': self.last_error,
+                'calls': self.calls,
+                'successes': self.successes,
+                'failures': self.failures,
+                'rejected': self.rejected,
+                'last_time': round(self.last_time, 3)
+                if self.last_time is not None else None,
+                'average_time': round(self.total_time / self.calls, 3)
+                if self.calls else None,
+            }
@@ -0,0 +1,129 @@
+"""
+Operações em lote sobre investimentos, rendas e despesas
+
+Each operation is one UPDATE or DELETE over the selected rows of the user,
+plus one bulk insert/delete of tag links. The snapshot, search index and
+caches are refreshed once per batch instead of once per row.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.functions import Round
+
+from .models import Investment, Income, Expense
+from .projection import projection_cache
+from .search import index_objects
+from .snapshots import rebuild_snapshot
+from .signals import bulk_operation, bump_user_cache_version
+
+BULK_KINDS = {
+    'investment': Investment,
+    'income': Income,
+    'expense': Expense,
+}
+# Field changed by adjust_amount
+AMOUNT_FIELDS = {
+    'investment': 'additional_contribution',
+    'income': 'monthly_income',
+    'expense': 'monthly_expense',
+}
+BULK_ACTIONS = ('activate', 'deactivate', 'add_tags', 'remove_tags',
+                'adjust_amount', 'delete')
+
+
+def selected(user, kind, ids):
+    return BULK_KINDS[kind].objects.filter(user=user, pk__in=ids)
+
+
+def _finish(user, kind, ids, reindex=True):
+    rebuild_snapshot(user.pk)
+    bump_user_cache_version(user.pk)
+    if reindex:
+        index_objects(kind, ids)
+    if kind == 'investment':
+        for pk in ids:
+            projection_cache.invalidate(pk)
+
+
+def set_active(user, ids, active):
+    """Ativa ou desativa os investimentos selecionados
+
+    Returns:
+        int: rows updated
+    """
+    updated = selected(user, 'investment', ids).update(active=active)
+    _finish(user, 'investment', ids, reindex=False)
+    return updated
+
+
+def adjust_amount(user, kind, ids, percent):
+    """Multiplica o valor mensal (AMOUNT_FIELDS) por 1 + percent / 100
+
+    Returns:
+        int: rows updated
+
+    Raises:
+        ValueError: percent would make the amounts negative
+    """
+    percent = Decimal(percent)
+    if percent < -100:
+        raise ValueError("percent must be at least -100.")
+    field = AMOUNT_FIELDS[kind]
+    updated = selected(user, kind, ids).update(**{field: Round(
+        F(field) * (1 + percent / 100), 2)})
+    _finish(user, kind, ids, reindex=False)
+    return updated
+
+
+def _tag_ids(user, kind, tag_ids):
+    tag_model = BULK_KINDS[kind].tags.field.related_model
+    return list(tag_model.objects.filter(
+        Q(user=user) | Q(user=None), pk__in=tag_ids).values_list('pk', flat=True))
+
+
+def add_tags(user, kind, ids, tag_ids):
+    """Liga as tags a todas as linhas selecionadas
+
+    Returns:
+        int: links requested (existing links are kept)
+    """
+    model = BULK_KINDS[kind]
+    through = model.tags.through
+    tag_column = f'{model.tags.field.related_model._meta.model_name}_id'
+    ids = list(selected(user, kind, ids).values_list('pk', flat=True))
+    tag_ids = _tag_ids(user, kind, tag_ids)
+    links = [through(**{f'{kind}_id': pk, tag_column: tag_id})
+             for pk in ids for tag_id in tag_ids]
+    through.objects.bulk_create(links, batch_size=1000, ignore_conflicts=True)
+    _finish(user, kind, ids)
+    return len(links)
+
+
+def remove_tags(user, kind, ids, tag_ids):
+    """Desliga as tags das linhas selecionadas
+
+    Returns:
+        int: links removed
+    """
+    model = BULK_KINDS[kind]
+    tag_column = f'{model.tags.field.related_model._meta.model_name}_id'
+    ids = list(selected(user, kind, ids).values_list('pk', flat=True))
+    removed, _ = model.tags.through.objects.filter(**{
+        f'{kind}_id__in': ids, f'{tag_column}__in': tag_ids}).delete()
+    _finish(user, kind, ids)
+    return removed
+
+
+def delete(user, kind, ids):
+    """Apaga as linhas selecionadas
+
+    Returns:
+        int: rows deleted
+    """
+    queryset = selected(user, kind, ids)
+    ids = list(queryset.values_list('pk', flat=True))
+    with transaction.atomic(), bulk_operation():
+        deleted = queryset.delete()[1].get(BULK_KINDS[kind]._meta.label, 0)
+    _finish(user, kind, ids)
+    return deleted
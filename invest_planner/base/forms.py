@@ -5,6 +5,7 @@ from datetime import date
 from django import forms
 from .models import InvestmentTag, IncomeTag, ExpenseTag
 from .models import Investment
+from .goal_seek import MAX_YEARS, goal_seek
 from .utils import get_central_bank_rate
 
 
@@ -20,6 +21,7 @@ class InvestmentForm(forms.ModelForm):
         )
     )
 
+    number_of_years = forms.IntegerField(max_value=MAX_YEARS)
     rate_type = forms.ChoiceField(choices=[('', '------')], required=False)
 
     class Meta:
@@ -31,13 +33,68 @@ class InvestmentForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         central_bank_rates = get_central_bank_rate()
-        rate_choices = [(tax['name'], f" {tax['name'].upper()} {tax['rate']}%") for tax in central_bank_rates['taxes']]
+        rate_choices = [
+            (tax['name'], f" {tax['name'].upper()} {tax['rate']}%" if tax['available']
+             else f" {tax['name'].upper()} (rate unavailable)")
+            for tax in central_bank_rates['taxes']]
         self.fields['rate_type'].choices = rate_choices
         self.fields['rate_value'].widget.attrs['readonly'] = False
         self.fields['rate_percentage'].widget.attrs['readonly'] = False
 
 
-class InvestmentTagForm(forms.ModelForm):
+class GoalSeekForm(forms.ModelForm):
+    """Formulário para calcular o parâmetro necessário para atingir uma meta
+    """
+    target = forms.DecimalField(max_digits=14, decimal_places=2, min_value=0)
+    solve_for = forms.ChoiceField(choices=[
+        ('additional_contribution', 'Monthly contribution'),
+        ('number_of_years', 'Number of years'),
+        ('return_rate', 'Return rate'),
+    ])
+    number_of_years = forms.IntegerField(max_value=MAX_YEARS)
+
+    class Meta:
+        model = Investment
+        fields = ['starting_amount', 'number_of_years', 'return_rate',
+                  'rate_type', 'rate_value', 'rate_percentage',
+                  'additional_contribution']
+
+    def solve(self):
+        """Resultado do goal seek, ou None com o erro registrado no formulário
+        """
+        try:
+            return goal_seek(self.instance, self.cleaned_data['target'],
+                             self.cleaned_data['solve_for'])
+        except ArithmeticError:
+            self.add_error(None, 'These values are too large to solve.')
+            return None
+
+
+class ImportForm(forms.Form):
+    """Formulário para importar um arquivo CSV ou OFX
+    """
+    file = forms.FileField()
+    kind = forms.ChoiceField(required=False, choices=[
+        ('', 'From the kind column'),
+        ('investment', 'Investments'),
+        ('income', 'Incomes'),
+        ('expense', 'Expenses'),
+    ])
+
+
+class TagForm(forms.ModelForm):
+    """Formulário base das tags; o nome é único por usuário e tipo
+    """
+
+    def clean_name(self):
+        name = self.cleaned_data['name']
+        tags = self._meta.model.objects.filter(user=self.instance.user, name=name)
+        if tags.exclude(pk=self.instance.pk).exists():
+            raise forms.ValidationError("A tag with this name already exists.")
+        return name
+
+
+class InvestmentTagForm(TagForm):
     """Formulário para tags de investimento
     """
     class Meta:
@@ -45,7 +102,7 @@ class InvestmentTagForm(forms.ModelForm):
         fields = ['name']
 
 
-class IncomeTagForm(forms.ModelForm):
+class IncomeTagForm(TagForm):
     """Formulário para tags de ganhos
     """
     class Meta:
@@ -53,7 +110,7 @@ class IncomeTagForm(forms.ModelForm):
         fields = ['name']
 
 
-class ExpenseTagForm(forms.ModelForm):
+class ExpenseTagForm(TagForm):
     """Formulário para tags de gastos
     """
     class Meta:
@@ -0,0 +1,141 @@
+"""
+Goal seek: parâmetro necessário para atingir um valor final
+"""
+import copy
+import math
+from decimal import Decimal, ROUND_CEILING
+
+from .projection import CENTS, monthly_rate, total_months
+
+RATE_BRACKET = (-100.0, 1000.0)
+MAX_YEARS = 200
+# math.exp overflows past ~709.78; growth beyond e**700 is far above any
+# target, so the solvers only need it to stay finite
+MAX_EXPONENT = 700.0
+
+
+def _future_value(starting_amount, rate, contribution, months):
+    if rate == 0:
+        return starting_amount + contribution * months
+    growth = math.exp(min(months * math.log1p(rate), MAX_EXPONENT))
+    return starting_amount * growth + contribution * (growth - 1) / rate
+
+
+def solve_contribution(investment, target):
+    """Aporte mensal necessário, invertendo a fórmula do valor futuro
+
+    Returns:
+        Decimal | None: contribution rounded up to the cent, or None when the
+        horizon is zero
+    """
+    months = total_months(investment)
+    if months == 0:
+        return None
+    rate = monthly_rate(investment)
+    if rate == 0:
+        contribution = (target - investment.starting_amount) / months
+    else:
+        growth = (1 + rate) ** months
+        contribution = (target - investment.starting_amount * growth) * \
+            rate / (growth - 1)
+    return max(contribution, Decimal('0.00')).quantize(CENTS, ROUND_CEILING)
+
+
+def solve_years(investment, target):
+    """Número de anos necessário, pelo logaritmo da fórmula do valor futuro
+
+    Returns:
+        int | None: whole years rounded up, or None when the target is never
+        reached within MAX_YEARS
+    """
+    starting_amount = float(investment.starting_amount)
+    contribution = float(investment.additional_contribution)
+    rate = float(monthly_rate(investment))
+    target = float(target)
+    if target <= starting_amount:
+        return 0
+
+    if rate == 0:
+        months = (target - starting_amount) / contribution if contribution > 0 \
+            else math.inf
+    else:
+        ratio = (target * rate + contribution) / \
+            (starting_amount * rate + contribution)
+        months = math.log(ratio) / math.log1p(rate) if ratio > 0 and \
+            starting_amount * rate + contribution > 0 else math.inf
+
+    if not 0 <= months <= MAX_YEARS * 12:
+        return None
+    years = math.ceil(months / 12 - 1e-9)
+    # Guard against float error right at a year boundary
+    if _future_value(starting_amount, rate, contribution, years * 12) < target:
+        years += 1
+    return years if years <= MAX_YEARS else None
+
+
+def solve_return_rate(investment, target, tolerance=1e-12):
+    """Taxa fixa anual (return_rate) necessária
+
+    The log of the final value is smooth and increasing in the rate, so
+    Newton steps on it are kept inside a shrinking bisection bracket.
+
+    Returns:
+        Decimal | None: annual % rounded up to 0.01, or None when the target
+        is out of RATE_BRACKET
+    """
+    months = total_months(investment)
+    starting_amount = float(investment.starting_amount)
+    contribution = float(investment.additional_contribution)
+    if months == 0 or target <= 0 or starting_amount + contribution <= 0:
+        return None
+    variable = float(monthly_rate(investment)) - \
+        float(investment.return_rate or 0) / 1200
+    log_target = math.log(target)
+
+    def excess(annual):
+        return math.log(_future_value(
+            starting_amount, annual / 1200 + variable, contribution, months)) \
+            - log_target
+
+    low, high = RATE_BRACKET
+    if excess(low) > 0 or excess(high) < 0:
+        return None
+
+    annual = (low + high) / 2
+    for _ in range(200):
+        value = excess(annual)
+        if abs(value) <= tolerance or high - low <= 1e-9:
+            break
+        if value > 0:
+            high = annual
+        else:
+            low = annual
+        step = 1e-7
+        slope = (excess(annual + step) - value) / step
+        candidate = annual - value / slope if slope > 0 else low
+        annual = candidate if low < candidate < high else (low + high) / 2
+
+    return Decimal(annual).quantize(CENTS, ROUND_CEILING)
+
+
+SOLVERS = {
+    'additional_contribution': solve_contribution,
+    'number_of_years': solve_years,
+    'return_rate': solve_return_rate,
+}
+
+
+def goal_seek(investment, target, solve_for):
+    """Resolve solve_for para que o valor final atinja target
+
+    Returns:
+        dict: solved field and value (None when unreachable) plus the final
+        value reached with it
+    """
+    value = SOLVERS[solve_for](investment, Decimal(target))
+    result = {'solve_for': solve_for, 'value': value, 'final_value': None}
+    if value is not None:
+        solved = copy.copy(investment)
+        setattr(solved, solve_for, value)
+        result['final_value'] = solved.final_value()
+    return result
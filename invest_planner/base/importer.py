@@ -0,0 +1,230 @@
+"""
+Importação em lote de investimentos, rendas e despesas (CSV/OFX)
+
+Rows are read one at a time and validated, then saved in chunks with
+bulk_create. Tags are linked with one bulk insert per chunk. bulk_create
+skips the post_save handlers, so the snapshot, search index and user cache
+are updated once per chunk or import, and one summary notification replaces
+the per-row ones.
+"""
+import csv
+import re
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F, Q
+
+from .models import Investment, Income, Expense, Notification
+from .rates import SGS_SERIES
+from .search import index_objects
+from .snapshots import rebuild_snapshot
+from .signals import bump_user_cache_version
+from .utils import get_central_bank_rate
+
+IMPORT_KINDS = {
+    'investment': Investment,
+    'income': Income,
+    'expense': Expense,
+}
+IMPORT_FIELDS = {
+    'investment': ('title', 'starting_amount', 'number_of_years', 'return_rate',
+                   'additional_contribution', 'rate_type', 'rate_value',
+                   'rate_percentage', 'active', 'starting_date'),
+    'income': ('title', 'monthly_income'),
+    'expense': ('title', 'monthly_expense'),
+}
+TAG_SEPARATOR = '|'
+CHUNK_SIZE = 1000
+MAX_ERRORS = 100
+
+
+def read_csv(stream, kind=None):
+    """Linhas de um CSV com cabeçalho, como (linha, tipo, campos, tags)
+
+    A 'kind' column is optional when ``kind`` is given. Tags go in a 'tags'
+    column separated by TAG_SEPARATOR.
+    """
+    sample = stream.read(4096)
+    stream.seek(0)
+    reader = csv.DictReader(
+        stream, dialect=csv.Sniffer().sniff(sample, delimiters=',;\t'))
+    for record in reader:
+        row_kind = (record.get('kind') or kind or '').strip().lower()
+        fields = {name: value.strip() for name, value in record.items()
+                  if name in IMPORT_FIELDS.get(row_kind, ()) and value is not None
+                  and value.strip() != ''}
+        tags = [name.strip() for name in (record.get('tags') or '').split(
+            TAG_SEPARATOR) if name.strip()]
+        yield reader.line_num, row_kind, fields, tags
+
+
+OFX_TAG = re.compile(r'<(/?)(\w+)>([^<\r\n]*)')
+
+
+def read_ofx(stream, kind=None):
+    """Transações (STMTTRN) de um extrato OFX, em SGML ou XML
+
+    Credits become incomes and debits expenses, with the absolute amount as
+    the monthly value. ``kind`` is ignored.
+    """
+    transaction_fields = None
+    for line_number, line in enumerate(stream, start=1):
+        for closing, name, value in OFX_TAG.findall(line):
+            name = name.upper()
+            if name == 'STMTTRN':
+                if not closing:
+                    transaction_fields = {}
+                    continue
+                if transaction_fields is not None:
+                    yield _ofx_row(line_number, transaction_fields)
+                transaction_fields = None
+            elif transaction_fields is not None and not closing:
+                transaction_fields[name] = value.strip()
+
+
+def _ofx_row(line_number, fields):
+    title = (fields.get('NAME') or fields.get('MEMO') or '')[:100]
+    try:
+        amount = Decimal(fields.get('TRNAMT', '').replace(',', '.'))
+    except InvalidOperation:
+        return line_number, 'expense', {'title': title,
+                                        'monthly_expense': fields.get('TRNAMT')}, []
+    if amount >= 0:
+        return line_number, 'income', {'title': title, 'monthly_income': amount}, []
+    return line_number, 'expense', {'title': title, 'monthly_expense': -amount}, []
+
+
+READERS = {
+    'csv': read_csv,
+    'ofx': read_ofx,
+}
+
+
+def format_for(name):
+    return 'ofx' if str(name).lower().endswith(('.ofx', '.qfx')) else 'csv'
+
+
+class Importer:
+    """
+    Validates and saves the rows of one user, CHUNK_SIZE at a time per kind
+    """
+
+    def __init__(self, user, chunk_size=CHUNK_SIZE):
+        self.user = user
+        self.chunk_size = chunk_size
+        self.created = {kind: 0 for kind in IMPORT_KINDS}
+        self.rejected = 0
+        self.errors = []
+        self._pending = {kind: [] for kind in IMPORT_KINDS}
+        self._tag_ids = {kind: {} for kind in IMPORT_KINDS}
+        self._rates = None
+
+    def reject(self, line, message):
+        self.rejected += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append((line, message))
+
+    def current_rates(self):
+        if self._rates is None:
+            self._rates = {tax['name']: Decimal(tax['rate'])
+                           for tax in get_central_bank_rate(refresh=False)['taxes']
+                           if tax['available']}
+        return self._rates
+
+    def add(self, line, kind, fields, tags):
+        if kind not in IMPORT_KINDS:
+            self.reject(line, f"Unknown kind: {kind!r}")
+            return
+        if kind == 'investment' and fields.get('rate_type'):
+            fields['rate_type'] = fields['rate_type'].lower()
+            if fields['rate_type'] in SGS_SERIES and 'rate_value' not in fields:
+                fields['rate_value'] = self.current_rates().get(
+                    fields['rate_type'], Decimal('0.00'))
+
+        instance = IMPORT_KINDS[kind](user=self.user, **fields)
+        try:
+            instance.full_clean(exclude=['user', 'tags'], validate_unique=False,
+                                validate_constraints=False)
+        except ValidationError as e:
+            self.reject(line, '; '.join(
+                f"{field}: {' '.join(messages)}"
+                for field, messages in e.message_dict.items()))
+            return
+        self._pending[kind].append((instance, tags))
+        if len(self._pending[kind]) >= self.chunk_size:
+            self.flush(kind)
+
+    def tag_ids(self, kind, names):
+        """Chaves das tags do tipo, criando as que faltam uma única vez
+
+        The user's own tag wins over a shared one (no user) of the same name.
+        """
+        known = self._tag_ids[kind]
+        tag_model = IMPORT_KINDS[kind].tags.field.related_model
+        missing = set(names) - set(known)
+        if missing:
+            known.update(tag_model.objects.filter(
+                Q(user=self.user) | Q(user=None), name__in=missing).order_by(
+                    F('user').asc(nulls_first=True)).values_list('name', 'pk'))
+            new = sorted(missing - set(known))
+            if new:
+                tag_model.objects.bulk_create(
+                    [tag_model(user=self.user, kind=tag_model.tag_kind, name=name)
+                     for name in new], ignore_conflicts=True)
+                known.update(tag_model.objects.filter(
+                    user=self.user, name__in=new).values_list('name', 'pk'))
+        return known
+
+    def flush(self, kind):
+        pending, self._pending[kind] = self._pending[kind], []
+        if not pending:
+            return
+        model = IMPORT_KINDS[kind]
+        through = model.tags.through
+        tag_column = f'{model.tags.field.related_model._meta.model_name}_id'
+        with transaction.atomic():
+            objects = model.objects.bulk_create(
+                [instance for instance, _ in pending], batch_size=self.chunk_size)
+            tag_ids = self.tag_ids(kind, {name for _, tags in pending
+                                          for name in tags})
+            through.objects.bulk_create([
+                through(**{f'{kind}_id': instance.pk, tag_column: tag_ids[name]})
+                for instance, (_, tags) in zip(objects, pending)
+                for name in tags
+            ], batch_size=self.chunk_size, ignore_conflicts=True)
+        index_objects(kind, [instance.pk for instance in objects])
+        self.created[kind] += len(objects)
+
+    def finish(self):
+        """Salva o que falta e atualiza snapshot, cache e notificação
+
+        Returns:
+            dict: created rows per kind, rejected count and the first
+            MAX_ERRORS errors as (line, message)
+        """
+        for kind in IMPORT_KINDS:
+            self.flush(kind)
+        rebuild_snapshot(self.user.pk)
+        bump_user_cache_version(self.user.pk)
+        Notification.objects.create(user=self.user, message=(
+            f"Import finished: {self.created['investment']} investments, "
+            f"{self.created['income']} incomes and {self.created['expense']} "
+            f"expenses created, {self.rejected} rows rejected."))
+        return {'created': self.created, 'rejected': self.rejected,
+                'errors': self.errors}
+
+
+def import_rows(user, stream, fmt='csv', kind=None, chunk_size=CHUNK_SIZE):
+    """Importa um arquivo aberto em modo texto
+
+    Returns:
+        dict: see Importer.finish
+    """
+    importer = Importer(user, chunk_size)
+    try:
+        for row in READERS[fmt](stream, kind):
+            importer.add(*row)
+    except csv.Error as e:
+        importer.reject(None, f"Invalid CSV: {e}")
+    return importer.finish()
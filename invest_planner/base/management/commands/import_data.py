@@ -0,0 +1,41 @@
+"""
+Importa investimentos, rendas e despesas de um arquivo CSV/OFX
+"""
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from base.importer import IMPORT_KINDS, READERS, format_for, import_rows
+
+
+class Command(BaseCommand):
+    help = "Bulk import investments, incomes and expenses of one user from a CSV or OFX file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--user', required=True, help="Username of the owner")
+        parser.add_argument('--kind', choices=list(IMPORT_KINDS),
+                            help="Kind of every row when the CSV has no kind column")
+        parser.add_argument('--format', choices=list(READERS), dest='fmt',
+                            help="File format (default: from the extension)")
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist as e:
+            raise CommandError(f"User {options['user']!r} does not exist.") from e
+
+        fmt = options['fmt'] or format_for(options['path'])
+        try:
+            with open(options['path'], newline='', encoding='utf-8-sig',
+                      errors='replace') as stream:
+                result = import_rows(user, stream, fmt, options['kind'],
+                                     options['chunk_size'])
+        except OSError as e:
+            raise CommandError(str(e)) from e
+
+        for kind, count in result['created'].items():
+            self.stdout.write(f"{kind}: {count} created")
+        self.stdout.write(f"{result['rejected']} rows rejected")
+        for line, message in result['errors']:
+            self.stderr.write(f"line {line}: {message}" if line else message)
@@ -0,0 +1,16 @@
+"""
+Recria o índice de busca
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from base.search import rebuild_index, search_available
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index of investments, incomes and expenses"
+
+    def handle(self, *args, **options):
+        if not search_available():
+            raise CommandError("The search index needs SQLite with FTS5.")
+        for kind, count in rebuild_index().items():
+            self.stdout.write(f"{kind}: {count} rows indexed")
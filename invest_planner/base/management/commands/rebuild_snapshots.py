@@ -0,0 +1,25 @@
+"""
+Recalcula os resumos financeiros dos usuários
+"""
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from base.snapshots import rebuild_snapshot
+
+
+class Command(BaseCommand):
+    help = "Rebuild UserFinancialSnapshot rows from the investment, income and expense tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users',
+                            help="Only rebuild these user ids (default: every user)")
+
+    def handle(self, *args, **options):
+        users = User.objects.all()
+        if options['users']:
+            users = users.filter(pk__in=options['users'])
+        count = 0
+        for user_id in users.values_list('pk', flat=True).iterator():
+            rebuild_snapshot(user_id)
+            count += 1
+        self.stdout.write(f"{count} snapshots rebuilt")
@@ -0,0 +1,39 @@
+"""
+Sincroniza as séries de CDI/SELIC com o banco central
+"""
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+import requests
+
+from base.breaker import CircuitOpenError
+from base.rates import SGS_SERIES
+from base.utils import sync_rates, load_rate_dump
+
+
+class Command(BaseCommand):
+    help = "Fetch CDI/SELIC observations newer than the latest stored date, or load them from a CSV/JSON dump"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--series', choices=list(SGS_SERIES), action='append',
+                            help="Series to sync (default: all)")
+        parser.add_argument('--since', type=date.fromisoformat,
+                            help="First date (YYYY-MM-DD) when nothing is stored yet")
+        parser.add_argument('--file',
+                            help="Load observations from a local CSV/JSON dump instead")
+
+    def handle(self, *args, **options):
+        try:
+            if options['file']:
+                series = options['series'] or [None]
+                if len(series) > 1:
+                    raise CommandError("Give at most one --series with --file.")
+                counts = load_rate_dump(options['file'], series[0])
+            else:
+                counts = sync_rates(options['series'], options['since'])
+        except (OSError, ValueError, KeyError, CircuitOpenError,
+                requests.exceptions.RequestException) as e:
+            raise CommandError(str(e)) from e
+
+        for name, count in counts.items():
+            self.stdout.write(f"{name}: {count} observations")
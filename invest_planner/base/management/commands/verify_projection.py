@@ -0,0 +1,23 @@
+"""
+Verifica o backend rápido das projeções contra o Decimal
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from base.projection import verify_float_backend
+
+
+class Command(BaseCommand):
+    help = "Compare the float projection backend with the Decimal one on random investments"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--samples', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        report = verify_float_backend(options['samples'], options['seed'])
+        self.stdout.write(
+            f"{report['samples']} investments, {report['rows']} rows, "
+            f"{report['mismatches']} mismatches, "
+            f"max difference R$ {report['max_difference']}")
+        if report['mismatches']:
+            raise CommandError("Float backend differs from Decimal.")
@@ -0,0 +1,43 @@
+"""
+Pré-carrega o cache compartilhado antes de o worker receber tráfego
+"""
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+import requests
+
+from base.breaker import CircuitOpenError
+from base.utils import get_central_bank_rate, get_portfolio_summary, sync_rates
+
+
+class Command(BaseCommand):
+    help = "Populate the shared cache with the central bank rates and per-user portfolio summaries"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sync', action='store_true',
+                            help="Sync the rates with the central bank first")
+        parser.add_argument('--user', type=int, action='append', dest='users',
+                            help="Only warm these user ids (default: every user with investments)")
+
+    def handle(self, *args, **options):
+        # No-op unless the database cache backend is configured
+        call_command('createcachetable', verbosity=0)
+
+        if options['sync']:
+            try:
+                sync_rates()
+            except (CircuitOpenError, requests.exceptions.RequestException) as e:
+                self.stderr.write(f"Rate sync failed, using stored rates: {e}")
+        cache.delete('central_bank_rates')
+        for tax in get_central_bank_rate(refresh=False)['taxes']:
+            self.stdout.write(f"{tax['name']}: {tax['rate'] or 'unavailable'}")
+
+        users = User.objects.filter(investment__isnull=False).distinct()
+        if options['users']:
+            users = User.objects.filter(pk__in=options['users'])
+        count = 0
+        for user in users.iterator():
+            get_portfolio_summary(user)
+            count += 1
+        self.stdout.write(f"{count} portfolio summaries cached")
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.1 on 2026-10-18 12:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0017_rename_created_at_notification_date_created_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateObservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('series', models.CharField(max_length=5)),
+                ('date', models.DateField()),
+                ('value', models.DecimalField(decimal_places=4, max_digits=10)),
+            ],
+            options={
+                'ordering': ['series', 'date'],
+                'constraints': [models.UniqueConstraint(fields=('series', 'date'), name='unique_rate_observation')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.1 on 2026-10-18 12:18
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('base', '0018_rateobservation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserFinancialSnapshot',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='financial_snapshot', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('total_invested', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=14)),
+                ('active_count', models.IntegerField(default=0)),
+                ('monthly_income', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=14)),
+                ('monthly_expense', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=14)),
+                ('projected_monthly_return', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=14)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
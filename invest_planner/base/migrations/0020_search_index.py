@@ -0,0 +1,46 @@
+from collections import defaultdict
+
+from django.db import migrations
+
+KINDS = ('investment', 'income', 'expense')
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS base_search_index USING fts5("
+            "kind, owner, title, tags, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')")
+        for code, kind in enumerate(KINDS):
+            model = apps.get_model('base', kind)
+            tag_model = model.tags.field.related_model
+            tags = defaultdict(list)
+            for row_id, name in model.tags.through.objects.values_list(
+                    f'{kind}_id', f'{tag_model._meta.model_name}__name'):
+                tags[row_id].append(name)
+            cursor.executemany(
+                "INSERT INTO base_search_index (rowid, kind, owner, title, tags) "
+                "VALUES (%s, %s, %s, %s, %s)",
+                [(pk * len(KINDS) + code, kind, f'u{user_id}', title or '',
+                  ', '.join(tags[pk]))
+                 for pk, user_id, title in model.objects.exclude(
+                     user=None).values_list('pk', 'user_id', 'title')])
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute("DROP TABLE IF EXISTS base_search_index")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0019_userfinancialsnapshot'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.1 on 2026-10-18 12:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0020_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='investment',
+            index=models.Index(fields=['user', '-active', '-starting_date', '-id'], name='investment_keyset'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'is_read', '-date_created', '-id'], name='notification_keyset'),
+        ),
+    ]
@@ -0,0 +1,105 @@
+from django.conf import settings
+from django.db import migrations, models
+
+# (model, tag model, related_name) of each tags field
+TAGGED = (
+    ('investment', 'investmenttag', 'investments'),
+    ('income', 'incometag', 'fixed_incomes'),
+    ('expense', 'expensetag', 'fixed_expenses'),
+)
+KINDS = [
+    ('investment', 'Investment'),
+    ('income', 'Income'),
+    ('expense', 'Expense'),
+]
+
+
+def set_tag_kinds(apps, schema_editor):
+    """Copia o tipo de cada tag da tabela filha para Tag.kind
+
+    The child tables share the primary key of base_tag, so the links of the
+    tags fields stay valid once they point at base_tag.
+    """
+    Tag = apps.get_model('base', 'Tag')
+    for kind, tag_model, _ in TAGGED:
+        Tag.objects.filter(pk__in=apps.get_model('base', tag_model).objects.values(
+            'tag_ptr_id')).update(kind=kind)
+
+
+def restore_child_tables(apps, schema_editor):
+    quote = schema_editor.connection.ops.quote_name
+    with schema_editor.connection.cursor() as cursor:
+        for kind, tag_model, _ in TAGGED:
+            cursor.execute(
+                f"INSERT INTO {quote('base_' + tag_model)} ({quote('tag_ptr_id')}) "
+                f"SELECT {quote('id')} FROM {quote('base_tag')} "
+                f"WHERE {quote('kind')} = %s", [kind])
+
+
+def tags_field(to, related_name):
+    return models.ManyToManyField(blank=True, related_name=related_name, to=to)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0021_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tag',
+            name='kind',
+            field=models.CharField(choices=KINDS, default='', max_length=10),
+            preserve_default=False,
+        ),
+        migrations.RunPython(set_tag_kinds, migrations.RunPython.noop),
+        # Point the tags fields at base_tag while the child models go away
+        *[migrations.AlterField(
+            model_name=model, name='tags',
+            field=tags_field('base.tag', related_name))
+          for model, _, related_name in TAGGED],
+        migrations.RunPython(migrations.RunPython.noop, restore_child_tables),
+        migrations.DeleteModel(name='ExpenseTag'),
+        migrations.DeleteModel(name='IncomeTag'),
+        migrations.DeleteModel(name='InvestmentTag'),
+        migrations.CreateModel(
+            name='ExpenseTag',
+            fields=[],
+            options={'proxy': True, 'indexes': [], 'constraints': []},
+            bases=('base.tag',),
+        ),
+        migrations.CreateModel(
+            name='IncomeTag',
+            fields=[],
+            options={'proxy': True, 'indexes': [], 'constraints': []},
+            bases=('base.tag',),
+        ),
+        migrations.CreateModel(
+            name='InvestmentTag',
+            fields=[],
+            options={'proxy': True, 'indexes': [], 'constraints': []},
+            bases=('base.tag',),
+        ),
+        *[migrations.AlterField(
+            model_name=model, name='tags',
+            field=tags_field(f'base.{tag_model}', related_name))
+          for model, tag_model, related_name in TAGGED],
+        migrations.AlterField(
+            model_name='tag',
+            name='name',
+            field=models.CharField(max_length=50),
+        ),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(
+                fields=('user', 'kind', 'name'), name='unique_tag'),
+        ),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(
+                condition=models.Q(('user', None)), fields=('kind', 'name'),
+                name='unique_shared_tag'),
+        ),
+    ]
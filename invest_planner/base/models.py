@@ -7,6 +7,7 @@ from decimal import Decimal
 from django.db import models
 from django.contrib.auth import get_user_model
 from datetime import timedelta
+from .projection import as_decimal, balance_at, monthly_rate, total_months
 
 User = get_user_model()
 
@@ -14,34 +15,108 @@ User = get_user_model()
 class Tag(models.Model):
     """
     Tag model
+
+    Investment, income and expense tags share this table; ``kind`` tells
+    them apart and the proxy models below only see their own kind.
     """
+    KINDS = [
+        ('investment', 'Investment'),
+        ('income', 'Income'),
+        ('expense', 'Expense'),
+    ]
+    # Kind given to the rows saved through a proxy model
+    tag_kind = None
+
     user = models.ForeignKey(
         User, on_delete=models.CASCADE, null=True, blank=True)
-    name = models.CharField(max_length=50, unique=True)
+    kind = models.CharField(max_length=10, choices=KINDS)
+    name = models.CharField(max_length=50)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'kind', 'name'], name='unique_tag'),
+            # NULL users never collide in the index above
+            models.UniqueConstraint(
+                fields=['kind', 'name'], condition=models.Q(user=None),
+                name='unique_shared_tag'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.tag_kind:
+            self.kind = self.tag_kind
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name
 
 
+class TagKindManager(models.Manager):
+    """
+    Tags of the kind of the proxy model
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().filter(kind=self.model.tag_kind)
+
+
 class InvestmentTag(Tag):
     """
     InvestmentTag extends Tag
     """
+    tag_kind = 'investment'
+    objects = TagKindManager()
+
+    class Meta:
+        proxy = True
 
 
 class IncomeTag(Tag):
     """
     IncomeTag extends Tag
     """
+    tag_kind = 'income'
+    objects = TagKindManager()
+
+    class Meta:
+        proxy = True
 
 
 class ExpenseTag(Tag):
     """
     ExpenseTag extends Tag
     """
+    tag_kind = 'expense'
+    objects = TagKindManager()
+
+    class Meta:
+        proxy = True
 
 
-class Investment(models.Model):
+class StoredValuesModel(models.Model):
+    """
+    Keeps the column values last read from or written to the database in
+    ``_stored_values``, so a save can tell what changed without a query
+    """
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._stored_values = dict(zip(field_names, values))
+        return instance
+
+    def remember_stored_values(self, update_fields=None):
+        stored = getattr(self, '_stored_values', {}) if update_fields else {}
+        stored.update({field.attname: getattr(self, field.attname)
+                       for field in self._meta.concrete_fields
+                       if update_fields is None or field.name in update_fields})
+        self._stored_values = stored
+
+
+class Investment(StoredValuesModel):
     """
     Investment model to save into database
     """
@@ -66,6 +141,13 @@ class Investment(models.Model):
     tags = models.ManyToManyField(
         InvestmentTag, related_name='investments', blank=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination order of InvestmentList
+            models.Index(fields=['user', '-active', '-starting_date', '-id'],
+                         name='investment_keyset'),
+        ]
+
     def __str__(self):
         return f"{self.title} ({self.starting_amount})"
 
@@ -77,6 +159,35 @@ class Investment(models.Model):
     def is_final_date_reached(self):
         return date.today() >= self.calculate_end_date()
 
+    @property
+    def total_months(self):
+        return total_months(self)
+
+    def value_at_month(self, month):
+        """
+        Saldo projetado ao fim do mês informado, sem montar a tabela mensal.
+        Months past the end of the plan return the final value.
+        """
+        month = min(max(month, 0), self.total_months)
+        return round(balance_at(
+            self.starting_amount, monthly_rate(self),
+            self.additional_contribution, month), 2)
+
+    def final_value(self):
+        """
+        Saldo projetado ao fim de number_of_years.
+        """
+        return self.value_at_month(self.total_months)
+
+    def total_contributed(self, month=None):
+        """
+        Valor aportado (inicial + aportes mensais) até o mês informado.
+        """
+        if month is None:
+            month = self.total_months
+        month = min(max(month, 0), self.total_months)
+        return self.starting_amount + self.additional_contribution * month
+
     def calculate_monthly_income(self):
         """
         Calcula o ganho mensal com base no return_rate e rate_percentage.
@@ -101,8 +212,15 @@ class Investment(models.Model):
             variable_return + self.additional_contribution
         return total_monthly_income
 
+    def projected_monthly_return(self):
+        """
+        Rendimento projetado do próximo mês sobre o valor inicial.
+        """
+        return (as_decimal(self.starting_amount) * monthly_rate(self)).quantize(
+            Decimal('0.01'))
+
 
-class Income(models.Model):
+class Income(StoredValuesModel):
     """
     Income model to save into database
     """
@@ -118,7 +236,7 @@ class Income(models.Model):
         return f"{self.title} ({self.monthly_income})"
 
 
-class Expense(models.Model):
+class Expense(StoredValuesModel):
     """
     Expenses model to save into database
     """
@@ -140,5 +258,54 @@ class Notification(models.Model):
     date_created = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination order of notifications_view
+            models.Index(fields=['user', 'is_read', '-date_created', '-id'],
+                         name='notification_keyset'),
+        ]
+
     def __str__(self):
         return f"Notification for {self.user.username} on {self.date_created}"
+
+
+class RateObservation(models.Model):
+    """
+    Daily CDI/SELIC value (% a.a.) from the Central Bank SGS series
+    """
+    series = models.CharField(max_length=5)
+    date = models.DateField()
+    value = models.DecimalField(max_digits=10, decimal_places=4)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['series', 'date'], name='unique_rate_observation'),
+        ]
+        ordering = ['series', 'date']
+
+    def __str__(self):
+        return f"{self.series.upper()} {self.date}: {self.value}%"
+
+
+class UserFinancialSnapshot(models.Model):
+    """
+    Dashboard totals of one user, kept up to date by applying the change of
+    each saved or deleted investment, income or expense
+    """
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True,
+        related_name='financial_snapshot')
+    total_invested = models.DecimalField(
+        max_digits=14, decimal_places=2, default=Decimal(0.00))
+    active_count = models.IntegerField(default=0)
+    monthly_income = models.DecimalField(
+        max_digits=14, decimal_places=2, default=Decimal(0.00))
+    monthly_expense = models.DecimalField(
+        max_digits=14, decimal_places=2, default=Decimal(0.00))
+    projected_monthly_return = models.DecimalField(
+        max_digits=14, decimal_places=2, default=Decimal(0.00))
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Snapshot of {self.user}"
@@ -0,0 +1,120 @@
+"""
+Paginação por cursor (keyset)
+
+A page is the rows that come after the last row of the previous page in
+the sort order, so with an index matching the order every page costs the
+same as the first one, unlike OFFSET.
+"""
+import base64
+import json
+from datetime import date, datetime
+
+from django.db import connection
+from django.db.models import BooleanField, Q
+from django.db.models.expressions import RawSQL
+
+
+class InvalidCursor(ValueError):
+    """
+    Cursor that cannot be decoded for this ordering
+    """
+
+
+def encode_cursor(values):
+    encoded = json.dumps([value.isoformat() if isinstance(value, (date, datetime))
+                          else value for value in values])
+    return base64.urlsafe_b64encode(encoded.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, fields):
+    """Valores do cursor convertidos para o tipo de cada campo
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(fields):
+            raise InvalidCursor(cursor)
+        return [field.to_python(value) for field, value in zip(fields, values)]
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(cursor) from e
+
+
+class KeysetPaginator:
+    """
+    Pages of ``queryset`` ordered by ``ordering`` (field names, '-' for
+    descending). The last field must be unique, e.g. 'id'.
+    """
+
+    def __init__(self, queryset, ordering, page_size=50):
+        self.queryset = queryset.order_by(*ordering)
+        self.keys = [(name.lstrip('-'), name.startswith('-')) for name in ordering]
+        self.fields = [queryset.model._meta.get_field(name) for name, _ in self.keys]
+        self.page_size = page_size
+
+    def _after(self, values):
+        """Condição "vem depois de values" na ordenação
+
+        When every key has the same direction this is a single row value
+        comparison, which the database answers with one index range scan.
+        """
+        directions = {descending for _, descending in self.keys}
+        if len(directions) == 1:
+            quote = connection.ops.quote_name
+            table = quote(self.queryset.model._meta.db_table)
+            columns = ', '.join(f'{table}.{quote(field.column)}' for field in self.fields)
+            marks = ', '.join(['%s'] * len(self.fields))
+            operator = '<' if directions.pop() else '>'
+            return RawSQL(
+                f'({columns}) {operator} ({marks})',
+                [field.get_db_prep_value(value, connection)
+                 for field, value in zip(self.fields, values)],
+                output_field=BooleanField())
+
+        condition = Q()
+        for position in reversed(range(len(self.keys))):
+            name, descending = self.keys[position]
+            lookup = 'lt' if descending else 'gt'
+            step = Q(**{f'{name}__{lookup}': values[position]})
+            if position < len(self.keys) - 1:
+                step |= Q(**{name: values[position]}) & condition
+            condition = step
+        return condition
+
+    def page(self, cursor=None):
+        """Linhas da página seguinte ao cursor
+
+        Returns:
+            tuple[list, str | None]: rows and the cursor of the next page, None
+            on the last page
+
+        Raises:
+            InvalidCursor: the cursor was not produced by this ordering
+        """
+        queryset = self.queryset
+        if cursor:
+            queryset = queryset.filter(self._after(decode_cursor(cursor, self.fields)))
+        rows = list(queryset[:self.page_size + 1])
+        if len(rows) <= self.page_size:
+            return rows, None
+        rows = rows[:self.page_size]
+        return rows, encode_cursor(
+            [getattr(rows[-1], field.attname) for field in self.fields])
+
+
+class KeysetPaginationMixin:
+    """
+    ListView mixin that shows one keyset page at a time (?cursor=) and puts
+    next_cursor in the context
+    """
+    ordering_keys = ('-id',)
+    page_size = 50
+
+    def get_context_data(self, **kwargs):
+        paginator = KeysetPaginator(
+            self.object_list, self.ordering_keys, self.page_size)
+        try:
+            rows, next_cursor = paginator.page(self.request.GET.get('cursor'))
+        except InvalidCursor:
+            rows, next_cursor = paginator.page()
+        context = super().get_context_data(object_list=rows, **kwargs)
+        context['next_cursor'] = next_cursor
+        return context
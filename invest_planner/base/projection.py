@@ -0,0 +1,548 @@
+"""
+Motor de projeção vetorizado dos investimentos
+"""
+import hashlib
+import random
+import threading
+from collections import OrderedDict
+from datetime import date
+from decimal import Decimal, localcontext
+from types import SimpleNamespace
+from typing import NamedTuple
+
+import numpy as np
+from django.conf import settings
+
+CENTS = Decimal('0.01')
+HUNDRED = Decimal('100')
+TWELVE = Decimal('12')
+# Extra digits for the Decimal closed form: 1 + rate and the division by
+# rate lose digits the month-by-month loop kept
+GUARD_DIGITS = 12
+
+PROJECTION_FIELDS = (
+    'starting_amount', 'return_rate', 'rate_type', 'rate_value',
+    'rate_percentage', 'additional_contribution', 'number_of_years',
+    'starting_date',
+)
+
+
+class ScheduleRow(NamedTuple):
+    """
+    One month of an investment schedule
+    """
+    date: date
+    monthly_income: Decimal
+    total_value: Decimal
+
+
+def as_decimal(value):
+    """Valor de um campo como Decimal, mesmo se atribuído como float ou str
+
+    Floats go through str so 10.5 becomes Decimal('10.5') and not its
+    binary expansion.
+    """
+    if isinstance(value, Decimal):
+        return value
+    return Decimal(str(value)) if value is not None else Decimal('0.00')
+
+
+def monthly_rate(investment):
+    """Taxa mensal (fixa + CDI/SELIC) aplicada sobre o saldo
+
+    Returns:
+        Decimal: monthly rate as a fraction (0.01 == 1% a.m.)
+    """
+    rate = as_decimal(investment.return_rate) / HUNDRED / TWELVE
+    if investment.rate_type and investment.rate_percentage and investment.rate_value:
+        rate += as_decimal(investment.rate_value) * \
+            as_decimal(investment.rate_percentage) / HUNDRED / HUNDRED / TWELVE
+    return rate
+
+
+def project_balances(starting_amount, rate, contribution, months, first_month=1):
+    """Calcula o saldo ao fim de cada mês de uma só vez
+
+    Each month the balance grows by ``rate`` and receives ``contribution``,
+    so month k is ``P * g**k + c * (g**k - 1) / rate`` with ``g = 1 + rate``.
+    Any window of months can be computed without the ones before it.
+
+    Returns:
+        numpy.ndarray: float64 balances for months
+        first_month..first_month + months - 1
+    """
+    k = np.arange(first_month, first_month + months, dtype=np.float64)
+    starting_amount = float(starting_amount)
+    contribution = float(contribution)
+    rate = float(rate)
+    if rate == 0:
+        return starting_amount + contribution * k
+    growth_minus_one = np.expm1(k * np.log1p(rate))
+    return starting_amount * (growth_minus_one + 1.0) + \
+        contribution * growth_minus_one / rate
+
+
+def balance_at(starting_amount, rate, contribution, month):
+    """Saldo ao fim do mês ``month`` pela fórmula do valor futuro
+
+    Decimal counterpart of project_balances for a single month, so it
+    matches the month-by-month Decimal schedule to the cent.
+
+    Returns:
+        Decimal: unrounded balance
+    """
+    if month <= 0:
+        return starting_amount
+    if rate == 0:
+        return starting_amount + contribution * month
+    with localcontext() as context:
+        context.prec += GUARD_DIGITS
+        growth = (1 + rate) ** month
+        balance = starting_amount * growth + contribution * (growth - 1) / rate
+    # Back to the context precision, where exact half cents stay ties
+    return +balance
+
+
+def month_dates(starting_date, months, skip=0):
+    """Primeiro dia de cada mês a partir de starting_date
+
+    Returns:
+        list[date]: one date per month, skipping the first ``skip`` months
+    """
+    first = np.datetime64(starting_date.replace(day=1), 'M')
+    return (first + np.arange(skip, skip + months)).astype(
+        'datetime64[D]').tolist()
+
+
+def total_months(investment):
+    return max(investment.number_of_years or 0, 0) * 12
+
+
+def projection_backend():
+    """Backend configurado em settings.PROJECTION_BACKEND ('float' ou 'decimal')
+    """
+    return getattr(settings, 'PROJECTION_BACKEND', 'float')
+
+
+def float_error_bound(values, months):
+    """Limite conservador do erro absoluto de project_balances
+
+    expm1/log1p are accurate to a few ulps and the exponent scales that by
+    the month number, so the relative error stays below (months + 8) * 4 ulps.
+    """
+    return np.abs(values) * (months + 8) * 4 * np.finfo(np.float64).eps
+
+
+def to_cents(values, bounds, exact):
+    """Arredonda floats para centavos, recorrendo ao Decimal perto de empates
+
+    A value is only rounded in float when its error bound cannot move it
+    across a half-cent boundary; otherwise exact(i) gives the Decimal value.
+    That makes the result identical to rounding the exact Decimal value.
+    """
+    cents = values * 100
+    ambiguous = np.abs(cents - np.floor(cents) - 0.5) <= bounds * 100 + 1e-9
+    result = [Decimal(value).scaleb(-2)
+              for value in np.rint(cents).astype(np.int64).tolist()]
+    for i in np.flatnonzero(ambiguous).tolist():
+        result[i] = exact(i).quantize(CENTS)
+    return result
+
+
+def schedule_rows(investment, first_month, count, backend=None):
+    """Linhas da tabela mensal para os meses first_month..first_month + count - 1
+
+    Months are numbered from 1, the first row of the full schedule. The
+    'decimal' backend evaluates the closed form in Decimal for every month;
+    'float' evaluates it with NumPy and only uses Decimal where the float
+    error bound could change the rounded cent.
+
+    Returns:
+        tuple[ScheduleRow, ...]: rows of the window
+    """
+    starting_amount = investment.starting_amount or Decimal('0.00')
+    contribution = investment.additional_contribution or Decimal('0.00')
+    rate = monthly_rate(investment)
+    dates = month_dates(investment.starting_date, count, skip=first_month - 1)
+
+    def exact(month):
+        return balance_at(starting_amount, rate, contribution, month)
+
+    if (backend or projection_backend()) == 'decimal':
+        balances = [exact(month)
+                    for month in range(first_month - 1, first_month + count)]
+        return tuple(ScheduleRow(month_date, (current - previous).quantize(CENTS),
+                                 current.quantize(CENTS))
+                     for month_date, previous, current
+                     in zip(dates, balances, balances[1:]))
+
+    balances = project_balances(
+        starting_amount, rate, contribution, count + 1,
+        first_month=first_month - 1)
+    errors = float_error_bound(balances, first_month + count)
+
+    return tuple(map(ScheduleRow._make, zip(
+        dates,
+        to_cents(np.diff(balances), errors[1:] + errors[:-1],
+                 lambda i: exact(first_month + i) - exact(first_month + i - 1)),
+        to_cents(balances[1:], errors[1:], lambda i: exact(first_month + i)),
+    )))
+
+
+def build_schedule(investment, backend=None):
+    """Monta a tabela mensal de um investimento
+
+    Returns:
+        tuple[tuple[ScheduleRow, ...], Decimal]: schedule rows and final value
+    """
+    months = total_months(investment)
+    if months == 0:
+        return (), round(investment.starting_amount or Decimal('0.00'), 2)
+
+    rows = schedule_rows(investment, 1, months, backend)
+    return rows, rows[-1].total_value
+
+
+def random_investment(rng):
+    """Investimento aleatório para o verificador
+    """
+    def amount(high):
+        return Decimal(rng.randint(0, high * 100)) / 100
+
+    return SimpleNamespace(
+        starting_amount=amount(10 ** 7), return_rate=amount(30),
+        rate_type=rng.choice([None, 'cdi', 'selic']), rate_value=amount(15),
+        rate_percentage=amount(150), additional_contribution=amount(10 ** 5),
+        number_of_years=rng.randint(0, 50),
+        starting_date=date(rng.randint(1990, 2040), rng.randint(1, 12), 1))
+
+
+def verify_float_backend(samples=1000, seed=None):
+    """Compara o backend 'float' com o 'decimal' num corpus aleatório
+
+    Returns:
+        dict: number of samples and rows compared, rows that differ and the
+        largest difference in reais
+    """
+    rng = random.Random(seed)
+    report = {'samples': samples, 'rows': 0, 'mismatches': 0,
+              'max_difference': Decimal('0.00')}
+    for _ in range(samples):
+        investment = random_investment(rng)
+        fast, _ = build_schedule(investment, backend='float')
+        exact, _ = build_schedule(investment, backend='decimal')
+        for fast_row, exact_row in zip(fast, exact):
+            difference = max(
+                abs(fast_row.total_value - exact_row.total_value),
+                abs(fast_row.monthly_income - exact_row.monthly_income))
+            report['rows'] += 1
+            report['mismatches'] += difference > 0
+            report['max_difference'] = max(report['max_difference'], difference)
+    return report
+
+
+def schedule_window(investment, offset, limit):
+    """Uma página da tabela mensal, sem calcular os meses anteriores
+
+    Args:
+        offset: number of months to skip (0 is the first month)
+        limit: maximum number of rows
+
+    Returns:
+        tuple[ScheduleRow, ...]: rows of the page, clamped to the horizon
+    """
+    offset = max(offset, 0)
+    count = min(limit, total_months(investment) - offset)
+    if count <= 0:
+        return ()
+    return schedule_rows(investment, offset + 1, count)
+
+
+def month_offset(investment, year, month):
+    """Índice (a partir de 0) do mês informado na tabela do investimento
+    """
+    start = investment.starting_date
+    return (year - start.year) * 12 + month - start.month
+
+
+def iter_schedule(investment, chunk_months=120):
+    """Gera a tabela mensal em blocos, com memória constante
+
+    Yields:
+        ScheduleRow: one row per month
+    """
+    months = total_months(investment)
+    for first_month in range(1, months + 1, chunk_months):
+        yield from schedule_rows(
+            investment, first_month, min(chunk_months, months - first_month + 1))
+
+
+class _CacheEntry(NamedTuple):
+    pk: int | None
+    rate_type: str
+    value: object
+
+
+class ProjectionCache:
+    """
+    LRU cache of computed projections keyed by a hash of PROJECTION_FIELDS,
+    so it never serves a projection for outdated investment data.
+    """
+
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._keys_by_pk = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def content_key(investment):
+        """Hash dos campos que afetam o cálculo
+        """
+        content = '|'.join(str(getattr(investment, field))
+                           for field in PROJECTION_FIELDS)
+        return hashlib.blake2b(content.encode(), digest_size=16).hexdigest()
+
+    def get_or_compute(self, investment, compute, variant=''):
+        """Retorna a projeção em cache ou calcula com compute(investment)
+
+        ``variant`` tells apart different results for the same investment,
+        such as pages of the schedule.
+        """
+        key = self.content_key(investment) + variant
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key].value
+            self.misses += 1
+
+        value = compute(investment)
+        with self._lock:
+            self._entries[key] = _CacheEntry(
+                investment.pk, (investment.rate_type or '').lower(), value)
+            self._entries.move_to_end(key)
+            if investment.pk is not None:
+                self._keys_by_pk.setdefault(investment.pk, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._discard(next(iter(self._entries)))
+        return value
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        keys = self._keys_by_pk.get(entry.pk)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_pk[entry.pk]
+
+    def invalidate(self, pk):
+        """Remove as projeções já calculadas para um investimento
+        """
+        with self._lock:
+            for key in self._keys_by_pk.pop(pk, set()):
+                self._discard(key)
+
+    def invalidate_rate_type(self, rate_type):
+        """Remove as projeções que dependem de CDI ou SELIC
+        """
+        rate_type = rate_type.lower()
+        with self._lock:
+            for key in [key for key, entry in self._entries.items()
+                        if entry.rate_type == rate_type]:
+                self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_pk.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        """Contadores de acertos e falhas
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+            }
+
+
+projection_cache = ProjectionCache()
+
+
+def cached_window(investment, offset, limit):
+    """schedule_window através do projection_cache
+    """
+    return projection_cache.get_or_compute(
+        investment, lambda item: schedule_window(item, offset, limit),
+        variant=f':{projection_backend()}:{offset}:{limit}')
+
+
+PORTFOLIO_FIELDS = ('id', *PROJECTION_FIELDS)
+
+
+def _column(rows, field):
+    return np.array([float(row[field] or 0) for row in rows], dtype=np.float64)
+
+
+def portfolio_rates(rows):
+    """Taxa mensal de cada linha de Investment.objects.values()
+
+    Vectorized version of monthly_rate.
+
+    Returns:
+        numpy.ndarray: float64 monthly rates
+    """
+    rate_value = _column(rows, 'rate_value')
+    rate_percentage = _column(rows, 'rate_percentage')
+    has_variable = np.array([bool(row['rate_type']) for row in rows]) & \
+        (rate_value != 0) & (rate_percentage != 0)
+    return _column(rows, 'return_rate') / 1200 + \
+        np.where(has_variable, rate_value * rate_percentage / 120000, 0.0)
+
+
+def calendar_layout(rows):
+    """Alinha os investimentos em meses de calendário
+
+    Returns:
+        tuple: first month (datetime64[M]), offset of each row from it and
+        length of each row, both in months
+    """
+    starts = np.array([row['starting_date'] for row in rows],
+                      dtype='datetime64[M]')
+    first = starts.min()
+    offsets = (starts - first).astype(np.int64)
+    lengths = np.array([max(row['number_of_years'] or 0, 0) * 12
+                        for row in rows], dtype=np.int64)
+    return first, offsets, lengths
+
+
+def project_portfolio(rows):
+    """Projeta vários investimentos juntos numa matriz investimento x mês
+
+    Columns are calendar months starting at the earliest starting_date.
+    A row is zero before its investment starts and keeps its final value
+    after number_of_years ends.
+
+    Args:
+        rows: dicts with PORTFOLIO_FIELDS, as from values()
+
+    Returns:
+        tuple[numpy.ndarray, numpy.ndarray]: months (datetime64[M]) and the
+        float64 balance matrix of shape (len(rows), len(months))
+    """
+    if not rows:
+        return np.array([], dtype='datetime64[M]'), np.zeros((0, 0))
+
+    first, offsets, lengths = calendar_layout(rows)
+    months = first + np.arange(max(int((offsets + lengths).max()), 1))
+
+    starting_amount = _column(rows, 'starting_amount')[:, None]
+    contribution = _column(rows, 'additional_contribution')[:, None]
+    rates = portfolio_rates(rows)[:, None]
+
+    elapsed = np.arange(len(months))[None, :] - offsets[:, None] + 1
+    k = np.clip(elapsed, 0, lengths[:, None]).astype(np.float64)
+    growth_minus_one = np.expm1(k * np.log1p(rates))
+    safe_rates = np.where(rates == 0, 1.0, rates)
+    annuity = np.where(rates == 0, k, growth_minus_one / safe_rates)
+    balances = starting_amount * (growth_minus_one + 1.0) + contribution * annuity
+    balances[elapsed <= 0] = 0.0
+    return months, balances
+
+
+def tag_subtotals(balances, row_tags):
+    """Soma a matriz do portfólio por tag
+
+    Args:
+        balances: matrix from project_portfolio
+        row_tags: one list of tag names per row
+
+    Returns:
+        dict[str, numpy.ndarray]: monthly subtotal per tag name
+    """
+    names = sorted({name for tags in row_tags for name in tags})
+    if not names:
+        return {}
+    index = {name: i for i, name in enumerate(names)}
+    membership = np.zeros((len(names), len(row_tags)))
+    for column, tags in enumerate(row_tags):
+        for name in tags:
+            membership[index[name], column] = 1.0
+    return dict(zip(names, membership @ balances))
+
+
+def portfolio_summary(rows, row_tags):
+    """Total mensal e subtotais por tag do portfólio, prontos para JSON
+
+    Returns:
+        dict: months as 'YYYY-MM', total and per-tag values in reais
+    """
+    months, balances = project_portfolio(rows)
+    return {
+        'months': np.datetime_as_string(months).tolist(),
+        'total': balances.sum(axis=0).round(2).tolist(),
+        'tags': {name: values.round(2).tolist()
+                 for name, values in tag_subtotals(balances, row_tags).items()},
+    }
+
+
+SWEEP_FIELDS = (
+    'starting_amount', 'return_rate', 'rate_value', 'rate_percentage',
+    'additional_contribution', 'number_of_years',
+)
+
+
+def sweep(base, axes):
+    """Valor final para todas as combinações dos parâmetros variados
+
+    Each axis becomes one dimension of the grid and the closed form is
+    evaluated over the whole grid with broadcasting.
+
+    Args:
+        base: investment with the values of the fixed parameters
+        axes: dict of SWEEP_FIELDS name -> sequence of values, in grid order
+
+    Returns:
+        numpy.ndarray: final values rounded to cents, one dimension per axis;
+        scenarios past the float range are inf or nan
+    """
+    shape = tuple(len(values) for values in axes.values())
+
+    def parameter(field):
+        if field not in axes:
+            return float(getattr(base, field) or 0)
+        position = list(axes).index(field)
+        return np.asarray(axes[field], dtype=np.float64).reshape(
+            [-1 if axis == position else 1 for axis in range(len(axes))])
+
+    rate = parameter('return_rate') / 1200
+    if base.rate_type:
+        rate = rate + parameter('rate_value') * \
+            parameter('rate_percentage') / 120000
+    months = np.maximum(np.floor(parameter('number_of_years')), 0) * 12
+    # Extreme scenarios overflow to inf or nan instead of warning
+    with np.errstate(over='ignore', invalid='ignore', divide='ignore'):
+        growth_minus_one = np.expm1(months * np.log1p(rate))
+        annuity = np.where(rate == 0, months,
+                           growth_minus_one / np.where(rate == 0, 1.0, rate))
+        values = parameter('starting_amount') * (growth_minus_one + 1.0) + \
+            parameter('additional_contribution') * annuity
+    return np.broadcast_to(values, shape).round(2)
+
+
+def finite_or_none(values):
+    """Troca NaN e ±Infinity por None, que o JSON representa como null
+
+    Returns:
+        numpy.ndarray: object array with floats and None
+    """
+    values = np.asarray(values, dtype=np.float64)
+    return np.where(np.isfinite(values), values, None)
@@ -0,0 +1,112 @@
+"""
+Índice das séries históricas de CDI/SELIC
+"""
+import threading
+
+import numpy as np
+
+SGS_SERIES = {
+    'cdi': 4389,
+    'selic': 1178,
+}
+BUSINESS_DAYS = 252
+
+
+class RateIndex:
+    """
+    Sorted observation dates with the cumulative log accumulation factor, so
+    the factor between any two dates is two binary searches and a subtraction.
+
+    Each observation (% a.a., base 252) accrues one business day on its date.
+    """
+
+    def __init__(self, dates, values):
+        self.dates = np.asarray(dates, dtype='datetime64[D]')
+        self.values = np.asarray(values, dtype=np.float64)
+        order = np.argsort(self.dates, kind='stable')
+        self.dates = self.dates[order]
+        self.values = self.values[order]
+        daily = np.log1p(self.values / 100) / BUSINESS_DAYS
+        self.cumulative = np.concatenate(([0.0], np.cumsum(daily)))
+
+    def __len__(self):
+        return len(self.dates)
+
+    @property
+    def first_date(self):
+        return self.dates[0].item() if len(self) else None
+
+    @property
+    def last_date(self):
+        return self.dates[-1].item() if len(self) else None
+
+    def _position(self, dates):
+        return np.searchsorted(
+            self.dates, np.asarray(dates, dtype='datetime64[D]'), side='left')
+
+    def factor_between(self, start, end):
+        """Fator acumulado das observações em [start, end)
+
+        Accepts single dates or arrays of dates. An end before the start is
+        an empty interval, with factor 1.
+        """
+        start = self._position(start)
+        end = np.maximum(self._position(end), start)
+        return np.exp(self.cumulative[end] - self.cumulative[start])
+
+    def rate_on(self, dates):
+        """Taxa vigente (% a.a.) na data: a última observação até ela
+
+        Accepts single dates or arrays of dates. Dates before the first
+        observation give None (NaN for arrays).
+        """
+        positions = np.searchsorted(
+            self.dates, np.asarray(dates, dtype='datetime64[D]'),
+            side='right') - 1
+        if np.ndim(positions) == 0:
+            return float(self.values[positions]) if positions >= 0 else None
+        return np.where(positions >= 0,
+                        self.values[np.maximum(positions, 0)], np.nan)
+
+    def monthly_values(self):
+        """Último valor observado em cada mês, do mais antigo ao mais recente
+        """
+        if not len(self):
+            return self.values
+        months = self.dates.astype('datetime64[M]')
+        last = np.append(np.flatnonzero(months[1:] != months[:-1]), len(self) - 1)
+        return self.values[last]
+
+
+class RateIndexRegistry:
+    """
+    RateIndex per series, built lazily on first use and shared by every
+    thread. ``version(series)`` is checked on each lookup, so a change made
+    by another worker (e.g. a sync) triggers a rebuild.
+    """
+
+    def __init__(self, loader, version=lambda series: None):
+        self._loader = loader
+        self._version = version
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def get(self, series):
+        """RateIndex da série, reconstruído se a versão mudou
+        """
+        version = self._version(series)
+        entry = self._indexes.get(series)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        with self._lock:
+            entry = self._indexes.get(series)
+            if entry is None or entry[0] != version:
+                entry = self._indexes[series] = (version, self._loader(series))
+        return entry[1]
+
+    def invalidate(self, series=None):
+        with self._lock:
+            if series is None:
+                self._indexes.clear()
+            else:
+                self._indexes.pop(series, None)
@@ -0,0 +1,224 @@
+"""
+Busca por título e tags em investimentos, rendas e despesas
+
+On SQLite the rows live in an FTS5 table (base_search_index) with prefix
+indexes. Each row's rowid encodes the kind and primary key, so updates
+touch a single row. The owner is an indexed column too, so a search
+intersects the user's postings instead of filtering everyone's matches.
+Other databases fall back to icontains filters.
+"""
+import re
+from collections import defaultdict
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Investment, Income, Expense
+
+SEARCH_TABLE = 'base_search_index'
+KINDS = {
+    'investment': Investment,
+    'income': Income,
+    'expense': Expense,
+}
+KIND_CODES = {name: code for code, name in enumerate(KINDS)}
+# bm25 weights in column order: kind, owner, title, tags
+WEIGHTS = (0.0, 0.0, 10.0, 4.0)
+MAX_TERMS = 8
+
+
+def search_available():
+    return connection.vendor == 'sqlite'
+
+
+def kind_of(model):
+    """Nome do tipo de um modelo (ou instância) indexado
+    """
+    model = model if isinstance(model, type) else type(model)
+    for name, kind_model in KINDS.items():
+        if issubclass(model, kind_model):
+            return name
+    return None
+
+
+def tagged_objects(tag):
+    """Tipo e chaves das linhas que usam a tag
+
+    Returns:
+        tuple[str | None, list[int]]: kind and primary keys
+    """
+    for kind, model in KINDS.items():
+        if isinstance(tag, model.tags.field.related_model):
+            return kind, list(model.objects.filter(
+                tags=tag).values_list('pk', flat=True))
+    return None, []
+
+
+def _rowid(kind, pk):
+    # rowid / len(KINDS) gives the primary key back
+    return pk * len(KINDS) + KIND_CODES[kind]
+
+
+def tag_names(model, **rows):
+    """Nomes das tags por linha de model, numa única consulta
+
+    ``rows`` filters the rows, e.g. ``user=user`` or ``pk__in=ids``.
+
+    Returns:
+        defaultdict[int, list[str]]: tag names per row primary key
+    """
+    through = model.tags.through
+    owner = model._meta.model_name
+    tag = model.tags.field.related_model
+    names = defaultdict(list)
+    for row_id, name in through.objects.filter(**{
+            f'{owner}__{lookup}': value for lookup, value in rows.items()}).values_list(
+                f'{owner}_id', f'{tag._meta.model_name}__name'):
+        names[row_id].append(name)
+    return names
+
+
+def _index_rows(kind, rows):
+    """Grava (pk, user_id, title) de kind no índice, com as tags atuais
+    """
+    rows = list(rows)
+    if not rows:
+        return
+    tags = tag_names(KINDS[kind], pk__in=[row[0] for row in rows])
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT OR REPLACE INTO {SEARCH_TABLE} "
+            "(rowid, kind, owner, title, tags) VALUES (%s, %s, %s, %s, %s)",
+            [(_rowid(kind, pk), kind, f'u{user_id}', title or '',
+              ', '.join(tags[pk])) for pk, user_id, title in rows])
+
+
+def index_objects(kind, ids):
+    """Reindexa as linhas de kind com as chaves informadas
+    """
+    if not search_available() or not ids:
+        return
+    ids = list(ids)
+    remove_objects(kind, ids)
+    _index_rows(kind, KINDS[kind].objects.filter(pk__in=ids).exclude(
+        user=None).values_list('pk', 'user_id', 'title'))
+
+
+def remove_objects(kind, ids):
+    if not search_available() or not ids:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s",
+                           [(_rowid(kind, pk),) for pk in ids])
+
+
+def rebuild_index(batch_size=2000):
+    """Recria o índice inteiro a partir das tabelas
+
+    Returns:
+        dict[str, int]: rows indexed per kind
+    """
+    if not search_available():
+        return {}
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+    counts = {}
+    for kind, model in KINDS.items():
+        counts[kind] = 0
+        batch = []
+        for row in model.objects.exclude(user=None).order_by('pk').values_list(
+                'pk', 'user_id', 'title').iterator(chunk_size=batch_size):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                _index_rows(kind, batch)
+                counts[kind] += len(batch)
+                batch = []
+        _index_rows(kind, batch)
+        counts[kind] += len(batch)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('optimize')")
+    return counts
+
+
+def match_expression(user, query, kind=None):
+    """Expressão MATCH do FTS5: cada palavra como prefixo, no título ou tags
+
+    Returns:
+        str | None: expression, or None when the query has no words
+    """
+    terms = re.findall(r'\w+', query.lower())[:MAX_TERMS]
+    if not terms:
+        return None
+    expression = f'owner:"u{user.pk}"'
+    if kind is not None:
+        expression += f' AND kind:"{kind}"'
+    words = ' '.join(f'"{term}"*' for term in terms)
+    return f'{expression} AND {{title tags}}: ({words})'
+
+
+def filter_queryset(queryset, user, query):
+    """Restringe queryset (de um dos KINDS) às linhas que casam com query
+    """
+    kind = kind_of(queryset.model)
+    if not search_available():
+        terms = Q(title__icontains=query) | Q(tags__name__icontains=query)
+        return queryset.filter(terms).distinct()
+    expression = match_expression(user, query, kind)
+    if expression is None:
+        return queryset
+    return queryset.filter(pk__in=RawSQL(
+        f"SELECT rowid / %s FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s",
+        (len(KINDS), expression)))
+
+
+def search(user, query, kinds=None, limit=20):
+    """Resultados ordenados por relevância (bm25) entre os tipos pedidos
+
+    Returns:
+        list[dict]: kind, id, title, tags and rank (lower is better)
+    """
+    kinds = [kind for kind in (kinds or KINDS) if kind in KINDS]
+    if not search_available():
+        results = []
+        for kind in kinds:
+            queryset = filter_queryset(
+                KINDS[kind].objects.filter(user=user), user, query)
+            results += [{'kind': kind, 'id': pk, 'title': title, 'tags': '',
+                         'rank': 0.0}
+                        for pk, title in queryset.values_list('pk', 'title')[:limit]]
+        return results[:limit]
+
+    expression = match_expression(user, query)
+    if expression is None or not kinds:
+        return []
+    if len(kinds) < len(KINDS):
+        expression += ' AND (' + ' OR '.join(
+            f'kind:"{kind}"' for kind in kinds) + ')'
+    weights = ', '.join(str(weight) for weight in WEIGHTS)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT kind, rowid / %s, title, tags, "
+            f"bm25({SEARCH_TABLE}, {weights}) AS rank FROM {SEARCH_TABLE} "
+            f"WHERE {SEARCH_TABLE} MATCH %s ORDER BY rank LIMIT %s",
+            (len(KINDS), expression, limit))
+        rows = cursor.fetchall()
+    return [{'kind': kind, 'id': pk, 'title': title, 'tags': tags, 'rank': rank}
+            for kind, pk, title, tags, rank in rows]
+
+
+def autocomplete(user, prefix, limit=10):
+    """Títulos e tags do usuário que começam com o texto digitado
+
+    Returns:
+        list[str]: distinct suggestions, best ranked first
+    """
+    start = prefix.strip().lower()
+    suggestions = []
+    for result in search(user, prefix, limit=limit * 2):
+        for text in [result['title'], *result['tags'].split(', ')]:
+            if text and text not in suggestions and \
+                    text.lower().startswith(start):
+                suggestions.append(text)
+    return suggestions[:limit]
@@ -0,0 +1,200 @@
+"""
+Receptores de sinais que mantêm snapshot, caches e índice de busca em dia
+
+BaseConfig.ready() imports this module, so the receivers are connected in
+every process (web workers, management commands, the shell and scripts)
+and not only where base.utils happens to be imported.
+"""
+import threading
+from contextlib import contextmanager
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .models import Investment, Income, Expense
+from .models import InvestmentTag, IncomeTag, ExpenseTag
+from .projection import projection_cache
+from .search import KINDS as INDEXED_KINDS
+from .search import index_objects, kind_of, remove_objects, tagged_objects
+from .snapshots import apply_delta, contribution, stored_contribution
+
+
+_bulk_operation = threading.local()
+
+
+@contextmanager
+def bulk_operation():
+    """Suspende os handlers por linha enquanto uma operação em lote roda
+
+    Deleting a queryset still sends post_delete for each row; inside this
+    block those handlers return at once and the caller refreshes the
+    snapshot, search index and caches once for the whole batch.
+    """
+    _bulk_operation.active = True
+    try:
+        yield
+    finally:
+        _bulk_operation.active = False
+
+
+def in_bulk_operation():
+    return getattr(_bulk_operation, 'active', False)
+
+
+@receiver(post_save, sender=Investment)
+@receiver(post_delete, sender=Investment)
+def invalidate_investment_projection(sender, instance, **kwargs):
+    if in_bulk_operation():
+        return
+    projection_cache.invalidate(instance.pk)
+
+
+def user_cache_version(user_id):
+    """Versão atual dos dados do usuário nas chaves do cache
+    """
+    version = cache.get(f'user_version:{user_id}')
+    if version is None:
+        cache.add(f'user_version:{user_id}', uuid4().hex, timeout=None)
+        version = cache.get(f'user_version:{user_id}')
+    return version
+
+
+def bump_user_cache_version(user_id):
+    """Invalida todos os resumos em cache do usuário de uma vez
+
+    The version is replaced by a new random value rather than incremented:
+    incr is a get and a set on the file backend, so two workers bumping at
+    once could both write the same number and reuse a version that already
+    has entries. A fresh value never matches an old key.
+    """
+    cache.set(f'user_version:{user_id}', uuid4().hex, timeout=None)
+
+
+@receiver(post_save, sender=Investment)
+@receiver(post_delete, sender=Investment)
+@receiver(post_save, sender=Income)
+@receiver(post_delete, sender=Income)
+@receiver(post_save, sender=Expense)
+@receiver(post_delete, sender=Expense)
+def invalidate_user_cache(sender, instance, **kwargs):
+    if in_bulk_operation():
+        return
+    bump_user_cache_version(instance.user_id)
+
+
+@receiver(pre_delete, sender=InvestmentTag)
+@receiver(pre_delete, sender=IncomeTag)
+@receiver(pre_delete, sender=ExpenseTag)
+def remember_tagged_objects(sender, instance, **kwargs):
+    instance._search_tagged = tagged_objects(instance)
+
+
+@receiver(pre_save, sender=Investment)
+@receiver(pre_save, sender=Income)
+@receiver(pre_save, sender=Expense)
+def remember_snapshot_contribution(sender, instance, **kwargs):
+    instance._snapshot_previous = stored_contribution(instance)
+
+
+@receiver(post_save, sender=Investment)
+@receiver(post_save, sender=Income)
+@receiver(post_save, sender=Expense)
+def update_snapshot_on_save(sender, instance, update_fields=None, **kwargs):
+    previous = getattr(instance, '_snapshot_previous', None)
+    if previous is not None and previous[0] != instance.user_id:
+        apply_delta(previous[0], old=previous[1], rebuild=False)
+        previous = None
+    apply_delta(instance.user_id, new=contribution(instance),
+                old=previous[1] if previous else None)
+    instance.remember_stored_values(update_fields)
+
+
+@receiver(post_delete, sender=Investment)
+@receiver(post_delete, sender=Income)
+@receiver(post_delete, sender=Expense)
+def update_snapshot_on_delete(sender, instance, **kwargs):
+    if in_bulk_operation():
+        return
+    apply_delta(instance.user_id, old=contribution(instance), rebuild=False)
+
+
+def tag_owner_ids(tag):
+    """Usuários cujos dados mostram a tag: o dono e os donos das linhas
+
+    Shared tags have no user, so renaming or deleting one changes the data
+    of everyone whose rows use it. On delete the rows are the ones kept by
+    remember_tagged_objects, since the links are gone by post_delete.
+    """
+    kind, ids = getattr(tag, '_search_tagged', None) or tagged_objects(tag)
+    owners = set()
+    if kind is not None and ids:
+        owners.update(INDEXED_KINDS[kind].objects.filter(pk__in=ids).exclude(
+            user=None).values_list('user_id', flat=True).distinct())
+    if tag.user_id is not None:
+        owners.add(tag.user_id)
+    return owners
+
+
+@receiver(post_save, sender=InvestmentTag)
+@receiver(post_delete, sender=InvestmentTag)
+@receiver(post_save, sender=IncomeTag)
+@receiver(post_delete, sender=IncomeTag)
+@receiver(post_save, sender=ExpenseTag)
+@receiver(post_delete, sender=ExpenseTag)
+def invalidate_user_cache_tag(sender, instance, **kwargs):
+    for user_id in tag_owner_ids(instance):
+        bump_user_cache_version(user_id)
+
+
+@receiver(m2m_changed, sender=Investment.tags.through)
+@receiver(m2m_changed, sender=Income.tags.through)
+@receiver(m2m_changed, sender=Expense.tags.through)
+def invalidate_user_cache_tags(sender, instance, action, **kwargs):
+    if action.startswith('post_') and hasattr(instance, 'user_id'):
+        bump_user_cache_version(instance.user_id)
+
+
+@receiver(post_save, sender=Investment)
+@receiver(post_save, sender=Income)
+@receiver(post_save, sender=Expense)
+def update_search_index(sender, instance, **kwargs):
+    index_objects(kind_of(sender), [instance.pk])
+
+
+@receiver(post_delete, sender=Investment)
+@receiver(post_delete, sender=Income)
+@receiver(post_delete, sender=Expense)
+def remove_from_search_index(sender, instance, **kwargs):
+    if in_bulk_operation():
+        return
+    remove_objects(kind_of(sender), [instance.pk])
+
+
+@receiver(m2m_changed, sender=Investment.tags.through)
+@receiver(m2m_changed, sender=Income.tags.through)
+@receiver(m2m_changed, sender=Expense.tags.through)
+def update_search_index_tags(sender, instance, action, reverse, model, pk_set,
+                             **kwargs):
+    if not reverse:
+        if action.startswith('post_'):
+            index_objects(kind_of(instance), [instance.pk])
+    elif action == 'pre_clear':
+        instance._search_tagged = tagged_objects(instance)
+    elif action == 'post_clear':
+        index_objects(*getattr(instance, '_search_tagged', (None, [])))
+    elif action.startswith('post_'):
+        index_objects(kind_of(model), pk_set)
+
+
+@receiver(post_save, sender=InvestmentTag)
+@receiver(post_save, sender=IncomeTag)
+@receiver(post_save, sender=ExpenseTag)
+@receiver(post_delete, sender=InvestmentTag)
+@receiver(post_delete, sender=IncomeTag)
+@receiver(post_delete, sender=ExpenseTag)
+def update_search_index_tag(sender, instance, **kwargs):
+    kind, ids = getattr(instance, '_search_tagged', None) or \
+        tagged_objects(instance)
+    index_objects(kind, ids)
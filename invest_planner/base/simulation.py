@@ -0,0 +1,174 @@
+"""
+Simulação Monte Carlo das taxas CDI/SELIC
+
+Rates follow a mean-reverting (Vasicek) process fitted to the rate history.
+Every path shares the same shocks across series, since CDI and SELIC move
+together. The module only depends on NumPy so pool workers can import it
+without configuring Django.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import NamedTuple
+
+import numpy as np
+
+from .projection import PORTFOLIO_FIELDS, calendar_layout
+
+PERCENTILES = (5, 50, 95)
+PARALLEL_THRESHOLD = 2000
+DEFAULT_KAPPA = 0.5
+DEFAULT_SIGMA = 2.0
+
+_pool = None
+
+
+class RateModel(NamedTuple):
+    """
+    Vasicek parameters for an annual rate in % (dt in years)
+    """
+    kappa: float
+    theta: float
+    sigma: float
+    current: float
+
+
+def default_rate_model(current):
+    """Modelo usado quando não há histórico suficiente
+    """
+    current = float(current)
+    return RateModel(DEFAULT_KAPPA, current, DEFAULT_SIGMA, current)
+
+
+def fit_rate_model(values, periods_per_year=12):
+    """Ajusta o modelo por regressão AR(1) sobre observações igualmente espaçadas
+
+    Args:
+        values: annual rates in %, oldest first
+        periods_per_year: sampling frequency of values
+
+    Returns:
+        RateModel: fitted parameters, or the default model around the last
+        value when the history is too short, constant or not mean-reverting
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) < 3 or np.ptp(values) == 0:
+        return default_rate_model(values[-1] if len(values) else 0.0)
+
+    slope, intercept = np.polyfit(values[:-1], values[1:], 1)
+    if not 0 < slope < 1:
+        return default_rate_model(values[-1])
+
+    dt = 1.0 / periods_per_year
+    residuals = values[1:] - (intercept + slope * values[:-1])
+    kappa = -np.log(slope) / dt
+    theta = intercept / (1 - slope)
+    sigma = residuals.std() * np.sqrt(2 * kappa / (1 - slope ** 2))
+    return RateModel(float(kappa), float(theta), float(sigma), float(values[-1]))
+
+
+def rate_paths(model, shocks):
+    """Trajetórias mensais da taxa anual usando discretização exata
+
+    Args:
+        model: RateModel
+        shocks: standard normal draws of shape (paths, months)
+
+    Returns:
+        numpy.ndarray: annual rates in %, shape of shocks, floored at zero
+    """
+    dt = 1.0 / 12
+    decay = np.exp(-model.kappa * dt)
+    scale = model.sigma * np.sqrt((1 - decay ** 2) / (2 * model.kappa))
+    paths = np.empty_like(shocks)
+    level = np.full(shocks.shape[0], model.current - model.theta)
+    for month in range(shocks.shape[1]):
+        level = level * decay + scale * shocks[:, month]
+        paths[:, month] = level
+    return np.maximum(paths + model.theta, 0.0)
+
+
+def simulate_balances(rows, models, paths, seed=None):
+    """Saldo total do portfólio em cada trajetória e mês
+
+    The balance recursion B_t = B_{t-1} * g_t + c is solved with cumulative
+    products, B_t = G_t * (P + c * sum(1 / G_j)), so the only loop over months
+    is the rate recursion itself.
+
+    Args:
+        rows: dicts with PORTFOLIO_FIELDS
+        models: RateModel per lowercase rate_type
+        paths: number of rate paths
+        seed: seed or numpy SeedSequence
+
+    Returns:
+        numpy.ndarray: balances of shape (paths, months)
+    """
+    _, offsets, lengths = calendar_layout(rows)
+    horizon = max(int((offsets + lengths).max()), 1)
+    shocks = np.random.default_rng(seed).standard_normal((paths, horizon))
+    series = {name: rate_paths(model, shocks) for name, model in models.items()}
+
+    total = np.zeros((paths, horizon))
+    for row, offset, length in zip(rows, offsets, lengths):
+        if length == 0:
+            total[:, offset:] += float(row['starting_amount'] or 0)
+            continue
+        window = slice(offset, offset + length)
+        rates = np.full((paths, length), float(row['return_rate'] or 0) / 1200)
+        rate_type = (row['rate_type'] or '').lower()
+        if rate_type in series and row['rate_percentage']:
+            rates += series[rate_type][:, window] * \
+                float(row['rate_percentage']) / 120000
+        growth = np.cumprod(1.0 + rates, axis=1)
+        balances = growth * (float(row['starting_amount'] or 0) + float(
+            row['additional_contribution'] or 0) * np.cumsum(1.0 / growth, axis=1))
+        total[:, window] += balances
+        total[:, offset + length:] += balances[:, -1:]
+    return total
+
+
+def _pool_executor():
+    global _pool  # pylint: disable=global-statement
+    if _pool is None:
+        # Forking a web worker would copy its threads, locks and database
+        # connections; spawned workers start clean and only import this module
+        _pool = ProcessPoolExecutor(max_workers=os.cpu_count(),
+                                    mp_context=get_context('spawn'))
+    return _pool
+
+
+def simulate(rows, models, paths, seed=None, parallel=None):
+    """Bandas de percentis (P5/P50/P95) do saldo por mês
+
+    Above PARALLEL_THRESHOLD paths the work is split in chunks with
+    independent random streams and run on a process pool.
+
+    Returns:
+        dict: months as 'YYYY-MM' and one list of values per percentile
+    """
+    rows = [{field: row[field] for field in PORTFOLIO_FIELDS} for row in rows]
+    if not rows:
+        return {'months': [], **{f'p{p}': [] for p in PERCENTILES}}
+
+    if parallel is None:
+        parallel = paths > PARALLEL_THRESHOLD
+    sequence = np.random.SeedSequence(seed)
+    if parallel:
+        workers = os.cpu_count() or 1
+        chunks = [len(chunk) for chunk in np.array_split(np.arange(paths), workers)
+                  if len(chunk)]
+        seeds = sequence.spawn(len(chunks))
+        balances = np.vstack(list(_pool_executor().map(
+            simulate_balances, [rows] * len(chunks), [models] * len(chunks),
+            chunks, seeds)))
+    else:
+        balances = simulate_balances(rows, models, paths, sequence)
+
+    first, _, _ = calendar_layout(rows)
+    bands = np.percentile(balances, PERCENTILES, axis=0).round(2)
+    months = first + np.arange(balances.shape[1])
+    return {
+        'months': np.datetime_as_string(months).tolist(),
+        **{f'p{p}': band.tolist() for p, band in zip(PERCENTILES, bands)},
+    }
@@ -0,0 +1,120 @@
+"""
+Resumo financeiro por usuário mantido incrementalmente
+"""
+from decimal import Decimal
+
+from django.db.models import Count, F, Q, Sum
+
+from .models import Investment, Income, Expense, UserFinancialSnapshot
+from .projection import as_decimal
+
+SNAPSHOT_FIELDS = ('total_invested', 'active_count', 'monthly_income',
+                   'monthly_expense', 'projected_monthly_return')
+# Columns each contribution is computed from
+SOURCE_FIELDS = {
+    Investment: ('user_id', 'starting_amount', 'active', 'return_rate',
+                 'rate_type', 'rate_value', 'rate_percentage'),
+    Income: ('user_id', 'monthly_income'),
+    Expense: ('user_id', 'monthly_expense'),
+}
+
+
+def contribution(instance):
+    """Quanto uma linha soma a cada campo do snapshot do seu usuário
+
+    Returns:
+        dict[str, Decimal | int]: value per SNAPSHOT_FIELDS name
+    """
+    if isinstance(instance, Investment):
+        return {
+            'total_invested': as_decimal(instance.starting_amount),
+            'active_count': int(bool(instance.active)),
+            'projected_monthly_return': instance.projected_monthly_return()
+            if instance.active else Decimal('0.00'),
+        }
+    if isinstance(instance, Income):
+        return {'monthly_income': as_decimal(instance.monthly_income)}
+    return {'monthly_expense': as_decimal(instance.monthly_expense)}
+
+
+def stored_contribution(instance):
+    """Usuário e contribuição da linha como está gravada no banco
+
+    Uses the values kept by StoredValuesModel when the instance was read or
+    saved through the ORM; only instances built by hand for an existing row
+    (or loaded with only()/defer()) need a query.
+
+    Returns:
+        tuple[int, dict] | None: user id and contribution, None for new rows
+    """
+    if instance._state.adding or instance.pk is None:
+        return None
+    model = type(instance)
+    fields = SOURCE_FIELDS[model]
+    values = getattr(instance, '_stored_values', {})
+    if not all(name in values for name in fields):
+        values = model._base_manager.filter(pk=instance.pk).values(*fields).first()
+        if values is None:
+            return None
+    stored = model(**{name: values[name] for name in fields})
+    return stored.user_id, contribution(stored)
+
+
+def apply_delta(user_id, new=None, old=None, rebuild=True):
+    """Soma new - old ao snapshot do usuário com um único UPDATE
+
+    When the user has no snapshot yet it is rebuilt from the tables, which
+    already include the change, unless rebuild is False. Deletes pass False:
+    the user may be the one being deleted, whose snapshot is already gone,
+    and a missing snapshot is built on the next get_snapshot anyway.
+    """
+    if user_id is None:
+        return
+    new, old = new or {}, old or {}
+    delta = {field: new.get(field, 0) - old.get(field, 0)
+             for field in set(new) | set(old)}
+    delta = {field: value for field, value in delta.items() if value}
+    if not delta:
+        return
+    updated = UserFinancialSnapshot.objects.filter(pk=user_id).update(
+        **{field: F(field) + value for field, value in delta.items()})
+    if not updated and rebuild:
+        rebuild_snapshot(user_id)
+
+
+def rebuild_snapshot(user_id):
+    """Recalcula o snapshot do usuário do zero
+
+    Returns:
+        UserFinancialSnapshot: saved snapshot
+    """
+    investments = Investment.objects.filter(user_id=user_id)
+    totals = investments.aggregate(
+        total_invested=Sum('starting_amount'),
+        active_count=Count('pk', filter=Q(active=True)))
+    projected = sum((investment.projected_monthly_return()
+                     for investment in investments.filter(active=True).only(
+                         'starting_amount', 'return_rate', 'rate_type',
+                         'rate_value', 'rate_percentage').iterator(2000)),
+                    Decimal('0.00'))
+    snapshot, _ = UserFinancialSnapshot.objects.update_or_create(
+        user_id=user_id, defaults={
+            'total_invested': totals['total_invested'] or Decimal('0.00'),
+            'active_count': totals['active_count'],
+            'monthly_income': Income.objects.filter(user_id=user_id).aggregate(
+                total=Sum('monthly_income'))['total'] or Decimal('0.00'),
+            'monthly_expense': Expense.objects.filter(user_id=user_id).aggregate(
+                total=Sum('monthly_expense'))['total'] or Decimal('0.00'),
+            'projected_monthly_return': projected,
+        })
+    return snapshot
+
+
+def get_snapshot(user):
+    """Snapshot do usuário, lido pela chave primária
+
+    Returns:
+        UserFinancialSnapshot: existing snapshot, or a freshly built one
+    """
+    snapshot = UserFinancialSnapshot.objects.filter(pk=user.pk).first()
+    return snapshot or rebuild_snapshot(user.pk)
@@ -1,7 +1,1578 @@
 """
 Default django tests
 """
-# pylint: disable=unused-import
-from django.test import TestCase
+import csv
+import io
+import json
+import math
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from datetime import date, timedelta
 
-# Create your tests here.
+import numpy as np
+import requests
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import CacheHandler, cache
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .models import Investment, InvestmentTag, Income, Expense
+from .models import IncomeTag, ExpenseTag, Tag
+from .models import RateObservation, UserFinancialSnapshot
+from .snapshots import SNAPSHOT_FIELDS, rebuild_snapshot
+from .utils import bump_user_cache_version, get_portfolio_summary
+from .utils import get_user_data_json, user_cache_version
+from .utils import bcb_breaker, fetch_rate, single_flight, sync_rates
+from .utils import is_service_failure, bump_rate_index_version
+from .utils import get_central_bank_rate, get_rate_index
+from .utils import refresh_rates_in_background, next_sync_date
+from .rates import RateIndex, RateIndexRegistry
+from .breaker import CircuitBreaker, CircuitOpenError
+from .search import autocomplete, rebuild_index, search
+from .pagination import KeysetPaginator
+from .importer import import_rows
+from . import bulk
+from .goal_seek import MAX_YEARS, goal_seek
+from .forms import InvestmentForm
+from .projection import ScheduleRow, build_schedule, schedule_rows
+from .projection import ProjectionCache, projection_cache, verify_float_backend
+from .simulation import PARALLEL_THRESHOLD
+from .views import SCHEDULE_COLUMNS
+
+
+class InvestmentListQueryBudgetTest(TestCase):
+    """
+    The main page must run the same number of queries for any number of
+    investments (session, user, list, tags prefetch, the totals and the tags
+    of the bulk action form).
+    """
+    budget = 6
+
+    def setUp(self):
+        self.user = User.objects.create_user('budget', password='budget')
+        self.client.force_login(self.user)
+        Income.objects.create(user=self.user, monthly_income=Decimal('5000'))
+        Expense.objects.create(user=self.user, monthly_expense=Decimal('2000'))
+
+    def add_investments(self, count):
+        first = Investment.objects.filter(user=self.user).count()
+        for number in range(first, first + count):
+            investment = Investment.objects.create(
+                user=self.user, title=f'inv {number}', number_of_years=2,
+                starting_amount=Decimal('1000'), return_rate=Decimal('10'),
+                active=number % 2 == 0)
+            investment.tags.add(InvestmentTag.objects.create(
+                user=self.user, name=f'tag {number}'))
+
+    def test_query_count_is_constant(self):
+        self.add_investments(1)
+        with self.assertNumQueries(self.budget):
+            self.client.get(reverse('investments'))
+
+        self.add_investments(20)
+        with self.assertNumQueries(self.budget):
+            response = self.client.get(reverse('investments'))
+
+        self.assertEqual(response.context['count'], 11)
+        self.assertEqual(response.context['total_investment_value'],
+                         Decimal('21000'))
+        self.assertEqual(response.context['monthly_income'], Decimal('5000'))
+        self.assertEqual(response.context['monthly_expense'], Decimal('2000'))
+        self.assertContains(response, 'tag 20')
+
+    def test_search_stays_within_budget(self):
+        self.add_investments(12)
+        with self.assertNumQueries(self.budget):
+            response = self.client.get(
+                reverse('investments'), {'search_box': 'tag 1'})
+        self.assertEqual(len(response.context['investments']), 3)
+
+
+class SnapshotMixin:
+    """
+    Compares the user's snapshot, kept up to date by deltas, with a rebuild
+    """
+
+    def assertMatchesRebuild(self):
+        snapshot = UserFinancialSnapshot.objects.get(pk=self.user.pk)
+        applied = {field: getattr(snapshot, field) for field in SNAPSHOT_FIELDS}
+        rebuilt = rebuild_snapshot(self.user.pk)
+        self.assertEqual(applied, {field: getattr(rebuilt, field)
+                                   for field in SNAPSHOT_FIELDS})
+
+
+class UserFinancialSnapshotTest(SnapshotMixin, TestCase):
+    """
+    Deltas applied by the signals must match a full rebuild
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('snapshot', password='snapshot')
+
+    def test_deltas_match_rebuild(self):
+        investment = Investment.objects.create(
+            user=self.user, starting_amount=Decimal('1000'),
+            return_rate=Decimal('12'), number_of_years=1)
+        Investment.objects.create(
+            user=self.user, starting_amount=Decimal('500'), rate_type='cdi',
+            rate_value=Decimal('10.65'), rate_percentage=Decimal('110'),
+            number_of_years=3)
+        income = Income.objects.create(
+            user=self.user, monthly_income=Decimal('3000'))
+        Expense.objects.create(user=self.user, monthly_expense=Decimal('800'))
+        self.assertMatchesRebuild()
+
+        investment.starting_amount = Decimal('2500')
+        investment.save()
+        self.assertMatchesRebuild()
+        investment.active = False
+        investment.save()
+        self.assertMatchesRebuild()
+        income.delete()
+        investment.delete()
+        self.assertMatchesRebuild()
+
+        snapshot = UserFinancialSnapshot.objects.get(pk=self.user.pk)
+        self.assertEqual(snapshot.total_invested, Decimal('500'))
+        self.assertEqual(snapshot.active_count, 1)
+        self.assertEqual(snapshot.monthly_income, Decimal('0'))
+        self.assertEqual(snapshot.monthly_expense, Decimal('800'))
+
+    def test_deleting_the_user_leaves_no_snapshot(self):
+        Investment.objects.create(
+            user=self.user, starting_amount=Decimal('1000'),
+            return_rate=Decimal('12'), number_of_years=1)
+        Income.objects.create(user=self.user, monthly_income=Decimal('3000'))
+        Expense.objects.create(user=self.user, monthly_expense=Decimal('800'))
+        self.assertTrue(UserFinancialSnapshot.objects.filter(
+            pk=self.user.pk).exists())
+
+        self.user.delete()
+        self.assertFalse(UserFinancialSnapshot.objects.exists())
+
+    def test_float_values(self):
+        investment = Investment.objects.create(
+            user=self.user, starting_amount=1000.0, return_rate=10.5,
+            number_of_years=2)
+        Income.objects.create(user=self.user, monthly_income=1500.25)
+        self.assertMatchesRebuild()
+        investment.additional_contribution = 50.0
+        investment.save()
+        self.assertEqual(self.user.financial_snapshot.total_invested,
+                         Decimal('1000'))
+
+    def test_saving_a_loaded_row_does_not_read_it_again(self):
+        Investment.objects.create(
+            user=self.user, starting_amount=Decimal('1000'),
+            return_rate=Decimal('12'), number_of_years=1)
+        investment = Investment.objects.get(user=self.user)
+        for amount in ('2000', '3000'):
+            investment.starting_amount = Decimal(amount)
+            with CaptureQueriesContext(connection) as queries:
+                investment.save()
+            self.assertFalse([query for query in queries
+                              if query['sql'].startswith('SELECT')
+                              and '"starting_amount"' in query['sql']])
+            self.assertMatchesRebuild()
+
+        stale = Investment(pk=investment.pk, user=self.user, number_of_years=1,
+                           starting_amount=Decimal('500'))
+        stale._state.adding = False
+        stale.save()
+        self.assertMatchesRebuild()
+
+
+class UserDataCacheTest(TestCase):
+    """
+    get_user_data is serialized in a fixed number of queries and cached
+    until the user's data changes
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('data', password='data')
+        for number in range(5):
+            investment = Investment.objects.create(
+                user=self.user, title=f'inv {number}', number_of_years=1,
+                starting_amount=Decimal('1000'), return_rate=Decimal('12'))
+            investment.tags.add(InvestmentTag.objects.create(
+                user=self.user, name=f'data inv {number}'))
+            Income.objects.create(user=self.user, title=f'income {number}').tags.add(
+                IncomeTag.objects.create(user=self.user, name=f'data income {number}'))
+            Expense.objects.create(user=self.user, title=f'expense {number}').tags.add(
+                ExpenseTag.objects.create(user=self.user, name=f'data expense {number}'))
+
+    def test_cached_until_changed(self):
+        with self.assertNumQueries(6):
+            data = json.loads(get_user_data_json(self.user))
+        self.assertEqual(len(data['investments']), 5)
+        self.assertEqual(data['income'][0]['tags'], ['data income 0'])
+        self.assertEqual(data['investments'][0]['final_value'], 1126.83)
+
+        with self.assertNumQueries(0):
+            get_user_data_json(self.user)
+
+        Income.objects.create(user=self.user, title='new income')
+        data = json.loads(get_user_data_json(self.user))
+        self.assertEqual(len(data['income']), 6)
+
+    def test_shared_tag_rename_and_delete(self):
+        tag = ExpenseTag.objects.create(name='data shared')
+        self.user.expense_set.get(title='expense 0').tags.add(tag)
+        data = json.loads(get_user_data_json(self.user))
+        self.assertIn('data shared', data['expenses'][0]['tags'])
+
+        tag.name = 'data renamed'
+        tag.save()
+        data = json.loads(get_user_data_json(self.user))
+        self.assertEqual(data['expenses'][0]['tags'],
+                         ['data expense 0', 'data renamed'])
+
+        tag.delete()
+        data = json.loads(get_user_data_json(self.user))
+        self.assertEqual(data['expenses'][0]['tags'], ['data expense 0'])
+
+
+class SharedCacheTest(TestCase):
+    """
+    Workers share the cache backend, and user entries are keyed by a version
+    that any change to the user's data bumps
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('cache', password='cache')
+        self.other = User.objects.create_user('cache other', password='cache')
+        self.investment = Investment.objects.create(
+            user=self.user, title='inv', number_of_years=1,
+            starting_amount=Decimal('1000'), return_rate=Decimal('12'))
+        self.tag = InvestmentTag.objects.create(name='cache shared')
+        self.investment.tags.add(self.tag)
+
+    def test_backends_are_shared_between_workers(self):
+        call_command('createcachetable', 'cache_table', verbosity=0)
+        with tempfile.TemporaryDirectory() as directory:
+            for backend, location in (
+                    ('django.core.cache.backends.filebased.FileBasedCache',
+                     directory),
+                    ('django.core.cache.backends.db.DatabaseCache', 'cache_table')):
+                config = {'BACKEND': backend, 'LOCATION': location,
+                          'KEY_PREFIX': 'invest_planner'}
+                # Two handlers stand in for two worker processes
+                first, second = (CacheHandler({'default': config})['default']
+                                 for _ in range(2))
+                first.set('portfolio:1:1', {'total': [1.0]})
+                self.assertEqual(second.get('portfolio:1:1'), {'total': [1.0]})
+                first.add('user_version:1', 'a', timeout=None)
+                second.set('user_version:1', 'b', timeout=None)
+                self.assertEqual(first.get('user_version:1'), 'b')
+
+    def test_versions_are_per_user(self):
+        version = user_cache_version(self.user.pk)
+        other_version = user_cache_version(self.other.pk)
+        self.assertEqual(user_cache_version(self.user.pk), version)
+        bump_user_cache_version(self.user.pk)
+        bumped = user_cache_version(self.user.pk)
+        self.assertNotEqual(bumped, version)
+        self.assertEqual(user_cache_version(self.other.pk), other_version)
+
+        cache.delete(f'user_version:{self.user.pk}')
+        bump_user_cache_version(self.user.pk)
+        self.assertNotIn(user_cache_version(self.user.pk), (version, bumped))
+
+    def test_portfolio_summary_follows_changes(self):
+        call_command('warm_cache', users=[self.user.pk], stdout=io.StringIO())
+        with self.assertNumQueries(0):
+            summary = get_portfolio_summary(self.user)
+        self.assertEqual(list(summary['tags']), ['cache shared'])
+        version = user_cache_version(self.user.pk)
+
+        self.tag.name = 'cache renamed'
+        self.tag.save()
+        self.assertNotEqual(user_cache_version(self.user.pk), version)
+        self.assertEqual(list(get_portfolio_summary(self.user)['tags']),
+                         ['cache renamed'])
+
+        self.tag.delete()
+        self.assertEqual(get_portfolio_summary(self.user)['tags'], {})
+
+        self.investment.starting_amount = Decimal('2000')
+        self.investment.save()
+        self.assertAlmostEqual(get_portfolio_summary(self.user)['total'][-1],
+                               2 * summary['total'][-1], places=1)
+
+
+class SearchIndexTest(TestCase):
+    """
+    The search index follows saves, tag changes and deletes
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('search', password='search')
+        self.other = User.objects.create_user('other', password='other')
+        self.investment = Investment.objects.create(
+            user=self.user, title='Tesouro Selic 2029')
+        self.income = Income.objects.create(user=self.user, title='Salário')
+        Investment.objects.create(user=self.other, title='Tesouro IPCA')
+
+    def found(self, query, **kwargs):
+        return [(result['kind'], result['id'])
+                for result in search(self.user, query, **kwargs)]
+
+    def test_index_follows_changes(self):
+        self.assertEqual(self.found('tes'), [('investment', self.investment.pk)])
+        self.assertEqual(self.found('salario'), [('income', self.income.pk)])
+
+        tag = InvestmentTag.objects.create(user=self.user, name='renda fixa')
+        self.investment.tags.add(tag)
+        self.assertEqual(self.found('renda', kinds=['investment']),
+                         [('investment', self.investment.pk)])
+        tag.name = 'liquidez diaria'
+        tag.save()
+        self.assertEqual(self.found('renda'), [])
+        self.assertEqual(autocomplete(self.user, 'liq'), ['liquidez diaria'])
+        tag.delete()
+        self.assertEqual(self.found('liquidez'), [])
+
+        self.investment.title = 'CDB'
+        self.investment.save()
+        self.assertEqual(self.found('tesouro'), [])
+        self.income.delete()
+        self.assertEqual(self.found('salario'), [])
+
+    def test_rebuild_and_list_search(self):
+        rebuild_index()
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('investments'), {'search_box': 'tesouro'})
+        self.assertEqual(list(response.context['investments']), [self.investment])
+        response = self.client.get(reverse('search'), {'q': 'sal'})
+        self.assertEqual(response.json()['results'][0]['title'], 'Salário')
+
+
+class KeysetPaginationTest(TestCase):
+    """
+    Walking every page gives each row once, in the list order
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('pages', password='pages')
+        for number in range(23):
+            Investment.objects.create(
+                user=self.user, title=f'page {number}', active=number % 3 != 0,
+                starting_date=date(2024, 1, 1) + timedelta(days=number % 5))
+
+    def test_pages_follow_the_ordering(self):
+        ordering = ('-active', '-starting_date', '-id')
+        queryset = Investment.objects.filter(user=self.user)
+        paginator = KeysetPaginator(queryset, ordering, page_size=5)
+        seen, cursor = [], None
+        while True:
+            rows, cursor = paginator.page(cursor)
+            seen += rows
+            if cursor is None:
+                break
+        self.assertEqual(seen, list(queryset.order_by(*ordering)))
+
+        mixed = KeysetPaginator(queryset, ('active', '-starting_date', 'id'), 4)
+        rows, cursor = mixed.page()
+        rows += mixed.page(cursor)[0]
+        self.assertEqual(rows, list(queryset.order_by(
+            'active', '-starting_date', 'id')[:8]))
+
+    def test_list_view_pages(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('investments'))
+        self.assertIsNone(response.context['next_cursor'])
+        self.assertEqual(len(response.context['investments']), 23)
+        response = self.client.get(reverse('investments'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 200)
+
+
+class ImportTest(TestCase):
+    """
+    Bulk import creates the rows, links tags once and sends one notification
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('import', password='import')
+
+    def test_csv(self):
+        rows = ['kind,title,starting_amount,number_of_years,return_rate,'
+                'monthly_income,tags']
+        rows += [f'investment,inv {number},1000,2,10,,fixa|longo'
+                 for number in range(25)]
+        rows += ['income,salary,,,,5000,', 'investment,bad,abc,2,10,,',
+                 'unknown,x,,,,,']
+        result = import_rows(self.user, io.StringIO('\n'.join(rows)),
+                             chunk_size=10)
+
+        self.assertEqual(result['created'], {
+            'investment': 25, 'income': 1, 'expense': 0})
+        self.assertEqual(result['rejected'], 2)
+        self.assertEqual(result['errors'][0][0], 28)
+        self.assertEqual(InvestmentTag.objects.count(), 2)
+        self.assertEqual(Investment.tags.through.objects.count(), 50)
+        self.assertEqual(self.user.notification_set.count(), 1)
+        self.assertEqual(self.user.financial_snapshot.total_invested,
+                         Decimal('25000'))
+        self.assertEqual(len(search(self.user, 'longo', limit=100)), 25)
+
+    def test_ofx(self):
+        statement = """OFXHEADER:100
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN><TRNTYPE>CREDIT<TRNAMT>3500.00<NAME>Salario
+</STMTTRN>
+<STMTTRN><TRNTYPE>DEBIT<TRNAMT>-120,50<MEMO>Internet</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>"""
+        result = import_rows(self.user, io.StringIO(statement), 'ofx')
+        self.assertEqual(result['created'], {
+            'investment': 0, 'income': 1, 'expense': 1})
+        self.assertEqual(Expense.objects.get().monthly_expense, Decimal('120.50'))
+
+
+class BulkOperationsTest(SnapshotMixin, TestCase):
+    """
+    Bulk actions touch only the user's rows and leave the snapshot equal to
+    a rebuild
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('bulk', password='bulk')
+        self.other = User.objects.create_user('bulk other', password='bulk')
+        self.investments = [Investment.objects.create(
+            user=self.user, title=f'inv {number}', number_of_years=2,
+            starting_amount=Decimal('1000'), return_rate=Decimal('10'),
+            additional_contribution=Decimal('100')) for number in range(6)]
+        self.foreign = Investment.objects.create(
+            user=self.other, title='foreign', number_of_years=2,
+            starting_amount=Decimal('1000'), return_rate=Decimal('10'))
+        self.ids = [investment.pk for investment in self.investments[:4]]
+        self.ids.append(self.foreign.pk)
+        self.tag = InvestmentTag.objects.create(user=self.user, name='bulk tag')
+
+    def test_set_active(self):
+        self.assertEqual(bulk.set_active(self.user, self.ids, False), 4)
+        self.assertEqual(self.user.investment_set.filter(active=True).count(), 2)
+        self.foreign.refresh_from_db()
+        self.assertTrue(self.foreign.active)
+        self.assertEqual(self.user.financial_snapshot.active_count, 2)
+        self.assertMatchesRebuild()
+
+    def test_tags(self):
+        bulk.add_tags(self.user, 'investment', self.ids, [self.tag.pk])
+        bulk.add_tags(self.user, 'investment', self.ids, [self.tag.pk])
+        self.assertEqual(self.tag.investments.count(), 4)
+        self.assertEqual(len(search(self.user, 'bulk tag')), 4)
+
+        bulk.remove_tags(self.user, 'investment', self.ids[:2], [self.tag.pk])
+        self.assertEqual(self.tag.investments.count(), 2)
+
+    def test_adjust_amount(self):
+        income = Income.objects.create(user=self.user,
+                                       monthly_income=Decimal('1000.00'))
+        bulk.adjust_amount(self.user, 'investment', self.ids, '12.5')
+        bulk.adjust_amount(self.user, 'income', [income.pk], '-10')
+        self.assertEqual(sorted(self.user.investment_set.values_list(
+            'additional_contribution', flat=True)),
+            [Decimal('100')] * 2 + [Decimal('112.5')] * 4)
+        self.assertEqual(self.user.financial_snapshot.monthly_income,
+                         Decimal('900'))
+        self.assertMatchesRebuild()
+        with self.assertRaises(ValueError):
+            bulk.adjust_amount(self.user, 'income', [income.pk], '-101')
+
+    def test_delete_view(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('bulk-action', args=['investment']),
+                                    {'action': 'delete', 'ids': self.ids})
+        self.assertRedirects(response, reverse('investments'))
+        self.assertEqual(self.user.investment_set.count(), 2)
+        self.assertTrue(Investment.objects.filter(pk=self.foreign.pk).exists())
+        self.assertEqual(self.user.financial_snapshot.total_invested,
+                         Decimal('2000'))
+        self.assertMatchesRebuild()
+
+        response = self.client.post(reverse('bulk-action', args=['investment']),
+                                    {'action': 'delete', 'ids': ['x']})
+        self.assertEqual(response.status_code, 400)
+
+
+class TagTableTest(TestCase):
+    """
+    Tags of every kind live in one table, unique per user, kind and name
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('tags', password='tags')
+        self.other = User.objects.create_user('tags other', password='tags')
+
+    def test_kinds_share_the_table(self):
+        investment_tag = InvestmentTag.objects.create(user=self.user, name='casa')
+        IncomeTag.objects.create(user=self.user, name='casa')
+        ExpenseTag.objects.create(user=self.other, name='casa')
+
+        self.assertEqual(Tag.objects.count(), 3)
+        self.assertEqual(list(InvestmentTag.objects.all()), [investment_tag])
+        self.assertEqual(Tag.objects.get(pk=investment_tag.pk).kind, 'investment')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            InvestmentTag.objects.create(user=self.user, name='casa')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            InvestmentTag.objects.create(name='shared')
+            InvestmentTag.objects.create(name='shared')
+
+    def test_prefetch_joins_only_the_link_table(self):
+        investment = Investment.objects.create(
+            user=self.user, title='inv', number_of_years=1,
+            starting_amount=Decimal('1000'), return_rate=Decimal('10'))
+        investment.tags.add(InvestmentTag.objects.create(user=self.user, name='a'))
+        with CaptureQueriesContext(connection) as queries:
+            [row.tags.all() for row in Investment.objects.prefetch_related('tags')]
+        self.assertEqual(queries[-1]['sql'].count('JOIN'), 1)
+        self.assertEqual(list(Investment.objects.filter(
+            tags__name='a')), [investment])
+
+
+class GoalSeekTest(TestCase):
+    """
+    Each solver returns the smallest value (to the cent or year) that
+    reaches the target, or None when it cannot be reached
+    """
+
+    def investment(self, **fields):
+        values = {'starting_amount': Decimal('1000'), 'number_of_years': 10,
+                  'return_rate': Decimal('12'),
+                  'additional_contribution': Decimal('100')}
+        values.update(fields)
+        return Investment(**values)
+
+    def assertSmallest(self, investment, solve_for, target, step):
+        result = goal_seek(investment, target, solve_for)
+        self.assertIsNotNone(result['value'])
+        self.assertGreaterEqual(result['final_value'], Decimal(target))
+        setattr(investment, solve_for, result['value'] - step)
+        self.assertLess(investment.final_value(), Decimal(target))
+        return result['value']
+
+    def test_contribution(self):
+        self.assertSmallest(self.investment(), 'additional_contribution',
+                            '50000', Decimal('0.01'))
+        self.assertEqual(goal_seek(self.investment(), '100', 'additional_contribution')
+                         ['value'], Decimal('0.00'))
+        self.assertIsNone(goal_seek(self.investment(number_of_years=0), '50000',
+                                    'additional_contribution')['value'])
+
+    def test_years(self):
+        self.assertSmallest(self.investment(), 'number_of_years', '50000', 1)
+        self.assertEqual(goal_seek(self.investment(), '500', 'number_of_years')
+                         ['value'], 0)
+        unreachable = self.investment(return_rate=Decimal('0'),
+                                      additional_contribution=Decimal('0'))
+        self.assertIsNone(goal_seek(unreachable, '5000', 'number_of_years')['value'])
+        self.assertIsNone(goal_seek(self.investment(return_rate=Decimal('1')),
+                                    '1e13', 'number_of_years')['value'])
+
+    def test_return_rate(self):
+        self.assertSmallest(self.investment(), 'return_rate', '50000',
+                            Decimal('0.01'))
+        self.assertIsNone(goal_seek(self.investment(number_of_years=1), '1e12',
+                                    'return_rate')['value'])
+
+    def test_long_horizons_do_not_overflow(self):
+        user = User.objects.create_user('goal', password='goal')
+        self.client.force_login(user)
+        for years in (98, 100, 200):
+            response = self.client.get(reverse('goal-seek-api'), {
+                'solve_for': 'return_rate', 'target': '1000000',
+                'starting_amount': '1000', 'number_of_years': years,
+                'return_rate': '0', 'additional_contribution': '0',
+                'rate_value': '0', 'rate_percentage': '0'})
+            self.assertEqual(response.status_code, 200)
+            self.assertIsNotNone(response.json()['value'])
+
+    def test_out_of_range_inputs_are_bad_requests(self):
+        user = User.objects.create_user('huge', password='huge')
+        self.client.force_login(user)
+        fields = {'solve_for': 'additional_contribution',
+                  'target': '999999999999.99', 'starting_amount': '1000',
+                  'number_of_years': 10 ** 9, 'return_rate': '12',
+                  'additional_contribution': '0', 'rate_value': '0',
+                  'rate_percentage': '0'}
+        response = self.client.post(reverse('goal-seek-api'), fields)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('number_of_years', response.json()['errors'])
+        self.assertFalse(InvestmentForm(data={'number_of_years': 10 ** 9})
+                         .is_valid())
+
+        huge = '99999999.99'
+        fields.update(number_of_years=MAX_YEARS, return_rate=huge,
+                      starting_amount=huge, additional_contribution=huge,
+                      rate_type='CDI', rate_value=huge, rate_percentage=huge)
+        for solve_for in ('additional_contribution', 'number_of_years'):
+            response = self.client.post(reverse('goal-seek-api'),
+                                        {**fields, 'solve_for': solve_for})
+            self.assertEqual(response.status_code, 400, solve_for)
+            self.assertIn('__all__', response.json()['errors'])
+        response = self.client.post(reverse('goal-seek'), fields)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].non_field_errors())
+        self.assertContains(response, 'These values are too large to solve.')
+
+
+
+class SweepViewTest(TestCase):
+    """
+    The sweep grid is always valid JSON and a bad ?investment= is a 404
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('sweep', password='sweep')
+        self.client.force_login(self.user)
+
+    def test_overflowing_scenarios_are_null(self):
+        investment = Investment.objects.create(
+            user=self.user, starting_amount=1000, additional_contribution=100)
+        response = self.client.get(reverse('sweep'), {
+            'investment': investment.pk, 'number_of_years': '10,100000',
+            'return_rate': '12,-1300'})
+        self.assertEqual(response.status_code, 200)
+        values = json.loads(response.content)['values']
+        # return_rate is the first axis, number_of_years the second
+        self.assertGreater(values[0][0], 12000)
+        self.assertIsNone(values[1][0])
+        self.assertIsNone(values[0][1])
+        self.assertNotIn(b'NaN', response.content)
+        self.assertNotIn(b'Infinity', response.content)
+
+    def test_non_finite_axes_are_rejected(self):
+        for text in ('NaN', '1,Infinity', '1e400'):
+            response = self.client.get(reverse('sweep'), {'return_rate': text})
+            self.assertEqual(response.status_code, 400, text)
+
+    def test_invalid_investment_is_not_found(self):
+        other = User.objects.create_user('other', password='other')
+        foreign = Investment.objects.create(user=other, starting_amount=1000)
+        for url, params in ((reverse('sweep'), {'return_rate': '1,2'}),
+                            (reverse('goal-seek'), {})):
+            for investment in ('abc', '1.5', str(foreign.pk)):
+                response = self.client.get(
+                    url, {**params, 'investment': investment})
+                self.assertEqual(response.status_code, 404, (url, investment))
+
+
+class StubSGS(ThreadingHTTPServer):
+    """
+    Local stand-in for the SGS API on a free port. ``statuses`` maps series
+    codes to an error status and ``delay`` slows every answer down.
+    """
+    daemon_threads = True
+
+    def __init__(self, delay=0.0):
+        super().__init__(('127.0.0.1', 0), StubSGSHandler)
+        self.delay = delay
+        self.statuses = {}
+        self.requests = []
+        self.active = self.max_active = 0
+        self.lock = threading.Lock()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_port}/bcdata.sgs.{{code}}/dados'
+
+
+class StubSGSHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append(self.path)
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            time.sleep(server.delay)
+            code = int(self.path.split('bcdata.sgs.')[1].split('/')[0])
+            status = server.statuses.get(code, 200)
+            body = json.dumps([{'data': '02/01/2024', 'valor': '0.043739'},
+                               {'data': '03/01/2024', 'valor': '0.043739'}]
+                              if status == 200 else {'error': status}).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+class RateFetchTest(TransactionTestCase):
+    """
+    Rate fetching against a local stub server: series are fetched in
+    parallel, concurrent callers share one request, and 404s and timeouts
+    are handled
+    """
+
+    def setUp(self):
+        cache.clear()
+        bcb_breaker.reset()
+        self.stub = StubSGS(delay=0.3)
+        self.settings = override_settings(BCB_SGS_URL=self.stub.url,
+                                          BCB_SGS_TIMEOUT=(1, 1))
+        self.settings.enable()
+
+    def tearDown(self):
+        self.settings.disable()
+        self.stub.shutdown()
+        self.stub.server_close()
+        bcb_breaker.reset()
+
+    def test_series_are_fetched_concurrently(self):
+        fetched = sync_rates(since=date.today() - timedelta(days=10))
+        self.assertEqual(fetched, {'cdi': 2, 'selic': 2})
+        self.assertEqual(len(self.stub.requests), 2)
+        self.assertEqual(self.stub.max_active, 2)
+        self.assertEqual(RateObservation.objects.count(), 4)
+
+    def test_single_flight_shares_one_request(self):
+        start = date(2024, 1, 1)
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(
+                lambda _: single_flight(
+                    'test_fetch:cdi', lambda: fetch_rate('cdi', start, start)),
+                range(4)))
+        self.assertEqual(len(self.stub.requests), 1)
+        self.assertEqual(len(results[0]), 2)
+        self.assertTrue(all(result == results[0] for result in results))
+
+    def test_not_found_means_no_data(self):
+        self.stub.statuses[4389] = 404
+        self.assertEqual(fetch_rate('cdi', date(2024, 1, 1)), [])
+        self.assertEqual(bcb_breaker.stats()['state'], 'closed')
+        self.assertEqual(bcb_breaker.stats()['failures'], 0)
+
+    def test_sync_fetches_only_after_the_last_stored_date(self):
+        self.stub.delay = 0
+        RateObservation.objects.create(
+            series='cdi', date=date(2024, 1, 2), value=Decimal('0.043739'))
+        self.assertEqual(next_sync_date('cdi'), date(2024, 1, 3))
+        self.assertEqual(next_sync_date('selic', since=date(2024, 1, 1)),
+                         date(2024, 1, 1))
+
+        sync_rates(['cdi'])
+        self.assertEqual(len(self.stub.requests), 1)
+        self.assertIn('dataInicial=03%2F01%2F2024', self.stub.requests[0])
+        # The stub answers 02/01 again, which is already stored
+        self.assertEqual(list(RateObservation.objects.filter(
+            series='cdi').values_list('date', flat=True)),
+            [date(2024, 1, 2), date(2024, 1, 3)])
+        sync_rates(['cdi'])
+        self.assertIn('dataInicial=04%2F01%2F2024', self.stub.requests[1])
+        self.assertEqual(RateObservation.objects.count(), 2)
+
+    def test_timeout(self):
+        self.stub.delay = 2
+        with override_settings(BCB_SGS_TIMEOUT=(1, 0.2)):
+            with self.assertRaises(requests.exceptions.Timeout):
+                fetch_rate('cdi')
+        self.assertEqual(bcb_breaker.stats()['failures'], 1)
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class CircuitBreakerTest(SimpleTestCase):
+    """
+    The breaker opens after BCB_BREAKER_FAILURES failures, rejects calls
+    while open and lets one probe through after BCB_BREAKER_RESET seconds
+    """
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker(
+            'test', settings.BCB_BREAKER_FAILURES, settings.BCB_BREAKER_RESET,
+            clock=self.clock)
+        self.calls = 0
+
+    def service(self, fail=False):
+        self.calls += 1
+        if fail:
+            raise requests.exceptions.ConnectionError('down')
+        return 'ok'
+
+    def fail(self, times):
+        for _ in range(times):
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                self.breaker.call(self.service, fail=True)
+
+    def test_opens_after_consecutive_failures(self):
+        self.fail(settings.BCB_BREAKER_FAILURES - 1)
+        self.assertEqual(self.breaker.call(self.service), 'ok')
+        self.fail(settings.BCB_BREAKER_FAILURES - 1)
+        self.assertEqual(self.breaker.state, 'closed')
+        self.fail(1)
+        self.assertEqual(self.breaker.state, 'open')
+
+        calls = self.calls
+        self.clock.now += settings.BCB_BREAKER_RESET - 1
+        with self.assertRaises(CircuitOpenError) as raised:
+            self.breaker.call(self.service)
+        self.assertEqual(self.calls, calls)
+        self.assertAlmostEqual(raised.exception.retry_in, 1)
+        self.assertEqual(self.breaker.stats()['rejected'], 1)
+
+    def test_probe_closes_on_success(self):
+        self.fail(settings.BCB_BREAKER_FAILURES)
+        self.clock.now += settings.BCB_BREAKER_RESET
+
+        def probe():
+            # A second call while the probe runs is still rejected
+            with self.assertRaises(CircuitOpenError):
+                self.breaker.call(self.service)
+            return self.service()
+
+        self.assertEqual(self.breaker.call(probe), 'ok')
+        self.assertEqual(self.breaker.state, 'closed')
+        self.assertEqual(self.breaker.call(self.service), 'ok')
+
+    def test_probe_failure_reopens(self):
+        self.fail(settings.BCB_BREAKER_FAILURES)
+        self.clock.now += settings.BCB_BREAKER_RESET
+        self.fail(1)
+        self.assertEqual(self.breaker.state, 'open')
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.call(self.service)
+        self.clock.now += settings.BCB_BREAKER_RESET
+        self.assertEqual(self.breaker.call(self.service), 'ok')
+
+    def test_service_failures(self):
+        def http_error(status):
+            response = requests.Response()
+            response.status_code = status
+            return requests.exceptions.HTTPError(response=response)
+
+        for status in (400, 403, 404, 422):
+            self.assertFalse(is_service_failure(http_error(status)), status)
+        for status in (429, 500, 502, 503):
+            self.assertTrue(is_service_failure(http_error(status)), status)
+        for error in (requests.exceptions.ReadTimeout(),
+                      requests.exceptions.ConnectTimeout(),
+                      requests.exceptions.ConnectionError(),
+                      ValueError('invalid JSON')):
+            self.assertTrue(is_service_failure(error), error)
+        self.assertFalse(is_service_failure(KeyError('valor')))
+
+    def test_fault_injecting_server(self):
+        stub = StubSGS()
+        bcb_breaker.reset()
+        try:
+            with override_settings(BCB_SGS_URL=stub.url):
+                stub.statuses[4389] = 400
+                for _ in range(settings.BCB_BREAKER_FAILURES):
+                    with self.assertRaises(requests.exceptions.HTTPError):
+                        fetch_rate('cdi')
+                self.assertEqual(bcb_breaker.state, 'closed')
+
+                stub.statuses[4389] = 503
+                for _ in range(settings.BCB_BREAKER_FAILURES):
+                    with self.assertRaises(requests.exceptions.HTTPError):
+                        fetch_rate('cdi')
+                sent = len(stub.requests)
+                with self.assertRaises(CircuitOpenError):
+                    fetch_rate('selic')
+                self.assertEqual(len(stub.requests), sent)
+        finally:
+            stub.shutdown()
+            stub.server_close()
+            bcb_breaker.reset()
+
+
+class FloatBackendTest(SimpleTestCase):
+    """
+    The float projection backend must round every row to the same cent as
+    the Decimal one
+    """
+
+    def assertSameSchedule(self, investment):
+        fast, fast_final = build_schedule(investment, backend='float')
+        exact, exact_final = build_schedule(investment, backend='decimal')
+        self.assertEqual(fast, exact)
+        self.assertEqual(fast_final, exact_final)
+
+    def test_random_investments(self):
+        report = verify_float_backend(samples=150, seed=20240101)
+        self.assertGreater(report['rows'], 10000)
+        self.assertEqual(report['mismatches'], 0)
+        self.assertEqual(report['max_difference'], Decimal('0.00'))
+
+    def test_rounding_ties(self):
+        # 0.5% a month makes odd amounts land exactly on half a cent
+        # (3.00 * 1.005 == 3.015), which float rounding alone gets wrong
+        ties = 0
+        for amount in range(1, 200, 2):
+            for contribution in ('0', '0.50', '1.25'):
+                investment = Investment(
+                    starting_amount=Decimal(amount), return_rate=Decimal('6'),
+                    additional_contribution=Decimal(contribution),
+                    number_of_years=2, starting_date=date(2024, 1, 1))
+                first = investment.starting_amount * Decimal('1.005')
+                ties += first.as_tuple().exponent == -3 and \
+                    first.as_tuple().digits[-1] == 5
+                self.assertSameSchedule(investment)
+        self.assertGreater(ties, 50)
+
+
+def month_by_month(investment, months):
+    """Tabela mensal calculada mês a mês, como InvestmentDetail fazia antes
+    do motor vetorizado
+    """
+    rows = []
+    total_amount = investment.starting_amount
+    current_date = investment.starting_date.replace(day=1)
+    for _ in range(months):
+        fixed_return = total_amount * investment.return_rate / \
+            Decimal('100') / Decimal('12')
+        if investment.rate_type and investment.rate_percentage and \
+                investment.rate_value:
+            variable_return = total_amount * (
+                investment.rate_value * investment.rate_percentage /
+                Decimal('100')) / Decimal('100') / Decimal('12')
+        else:
+            variable_return = Decimal('0.00')
+        total_monthly_income = fixed_return + variable_return + \
+            investment.additional_contribution
+        total_amount += total_monthly_income
+        rows.append(ScheduleRow(current_date, round(total_monthly_income, 2),
+                                round(total_amount, 2)))
+        current_date = current_date.replace(
+            year=current_date.year + current_date.month // 12,
+            month=current_date.month % 12 + 1)
+    return tuple(rows)
+
+
+class ClosedFormScheduleTest(SimpleTestCase):
+    """
+    The closed-form schedule matches the month-by-month Decimal loop it
+    replaced, row by row
+    """
+
+    def investment(self, **fields):
+        values = {'starting_amount': Decimal('15000.00'),
+                  'return_rate': Decimal('7.25'), 'rate_type': 'cdi',
+                  'rate_value': Decimal('10.65'), 'rate_percentage': Decimal('110'),
+                  'additional_contribution': Decimal('350.00'),
+                  'number_of_years': 5, 'starting_date': date(2023, 11, 15)}
+        values.update(fields)
+        return Investment(**values)
+
+    def assertMatchesLoop(self, investment):
+        expected = month_by_month(investment, investment.total_months)
+        for backend in ('float', 'decimal'):
+            rows, final_value = build_schedule(investment, backend)
+            self.assertEqual(rows, expected, backend)
+            if expected:
+                self.assertEqual(final_value, expected[-1].total_value)
+        if expected:
+            self.assertEqual(investment.final_value(), expected[-1].total_value)
+
+    def test_matches_loop(self):
+        self.assertMatchesLoop(self.investment())
+        self.assertMatchesLoop(self.investment(rate_type=None))
+
+    def test_zero_rate(self):
+        self.assertMatchesLoop(self.investment(
+            return_rate=Decimal('0'), rate_type=None))
+        self.assertMatchesLoop(self.investment(
+            return_rate=Decimal('0'), rate_percentage=Decimal('0')))
+
+    def test_zero_contribution(self):
+        self.assertMatchesLoop(self.investment(
+            additional_contribution=Decimal('0')))
+        self.assertMatchesLoop(self.investment(
+            additional_contribution=Decimal('0'), starting_amount=Decimal('0')))
+
+    def test_one_month(self):
+        investment = self.investment()
+        expected = month_by_month(investment, 1)
+        for backend in ('float', 'decimal'):
+            self.assertEqual(schedule_rows(investment, 1, 1, backend), expected)
+        self.assertEqual(investment.value_at_month(1), expected[0].total_value)
+
+    def test_long_horizons(self):
+        for years in (50, 65):
+            self.assertMatchesLoop(self.investment(number_of_years=years))
+            investment = self.investment(number_of_years=years,
+                                         additional_contribution=Decimal('0'))
+            self.assertMatchesLoop(investment)
+            expected = month_by_month(investment, investment.total_months)
+            for month in (1, 12, 301, investment.total_months):
+                self.assertEqual(investment.value_at_month(month),
+                                 expected[month - 1].total_value)
+
+
+class ProjectionCacheTest(TestCase):
+    """
+    Computed windows are kept in an LRU keyed by the investment content and
+    dropped when the investment is saved
+    """
+
+    def setUp(self):
+        projection_cache.clear()
+        self.user = User.objects.create_user('window', password='window')
+        self.client.force_login(self.user)
+        self.investment = Investment.objects.create(
+            user=self.user, title='inv', number_of_years=2,
+            starting_amount=Decimal('1000'), return_rate=Decimal('12'),
+            additional_contribution=Decimal('100'), starting_date=date(2024, 3, 10))
+
+    def test_lru_eviction(self):
+        cache = ProjectionCache(maxsize=2)
+        investments = [Investment(pk=pk, starting_amount=Decimal(pk),
+                                  number_of_years=1) for pk in (1, 2, 3)]
+        for investment in investments[:2]:
+            cache.get_or_compute(investment, lambda item: item.pk)
+        cache.get_or_compute(investments[0], lambda item: item.pk)
+        cache.get_or_compute(investments[2], lambda item: item.pk)
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 3, 'size': 2,
+                                         'maxsize': 2})
+
+        # 2 was the least recently used, so it is computed again
+        self.assertEqual(cache.get_or_compute(investments[0], lambda item: None), 1)
+        self.assertEqual(cache.get_or_compute(investments[1], lambda item: 'new'), 'new')
+        self.assertEqual(cache.stats()['misses'], 4)
+
+        cache.invalidate(1)
+        self.assertEqual(cache.get_or_compute(investments[0], lambda item: 'new'), 'new')
+
+    def window(self, **params):
+        response = self.client.get(
+            reverse('investment-schedule', args=[self.investment.pk]), params)
+        return response.status_code, response.json()
+
+    def test_invalidated_on_save(self):
+        _, first = self.window(limit=1)
+        self.assertEqual(projection_cache.stats()['size'], 1)
+        self.window(limit=1)
+        self.assertEqual(projection_cache.stats()['hits'], 1)
+
+        self.investment.additional_contribution = Decimal('200')
+        self.investment.save()
+        self.assertEqual(projection_cache.stats()['size'], 0)
+        _, second = self.window(limit=1)
+        self.assertNotEqual(first['rows'], second['rows'])
+        self.assertEqual(second['rows'][0]['total_value'], '1210.00')
+
+    def test_offset_and_limit_bounds(self):
+        status, page = self.window()
+        self.assertEqual((status, page['offset'], len(page['rows']),
+                          page['next_offset'], page['total']), (200, 0, 24, None, 24))
+        _, page = self.window(offset=20, limit=10)
+        self.assertEqual((page['offset'], len(page['rows']), page['next_offset']),
+                         (20, 4, None))
+        _, page = self.window(offset=5, limit=5)
+        self.assertEqual((page['rows'][0]['date'], page['next_offset']),
+                         ('2024-08-01', 10))
+        _, page = self.window(offset=-3, limit=2)
+        self.assertEqual((page['offset'], page['rows'][0]['date']),
+                         (0, '2024-03-01'))
+        _, page = self.window(offset=99)
+        self.assertEqual((page['offset'], page['rows']), (24, []))
+        _, page = self.window(limit=10 ** 6)
+        self.assertEqual(len(page['rows']), 24)
+        _, page = self.window(limit=-1)
+        self.assertEqual(page['rows'], [])
+        self.assertEqual(self.window(offset='x')[0], 400)
+
+    def test_month_bounds(self):
+        _, page = self.window(**{'from': '2024-05', 'to': '2024-07'})
+        self.assertEqual([row['date'] for row in page['rows']],
+                         ['2024-05-01', '2024-06-01', '2024-07-01'])
+        _, page = self.window(**{'from': '2020-01', 'to': '2024-04'})
+        self.assertEqual([row['date'] for row in page['rows']],
+                         ['2024-03-01', '2024-04-01'])
+        _, page = self.window(**{'from': '2025-12'})
+        self.assertEqual([row['date'] for row in page['rows']],
+                         ['2025-12-01', '2026-01-01', '2026-02-01'])
+        _, page = self.window(**{'to': '2023-01'})
+        self.assertEqual(page['rows'], [])
+        self.assertEqual(self.window(**{'from': '05/2024'})[0], 400)
+
+    def test_export_uses_the_api_encoding(self):
+        _, page = self.window(limit=1)
+        response = self.client.get(reverse(
+            'investment-schedule-export', args=[self.investment.pk, 'jsonl']))
+        line = json.loads(b''.join(response.streaming_content).splitlines()[0])
+        self.assertEqual(line['total_value'], page['rows'][0]['total_value'])
+        self.assertIsInstance(line['monthly_income'], str)
+
+
+class SimulationViewTest(TestCase):
+    """
+    Small simulations answer inline; larger ones return 202 and a job that
+    only its owner can poll
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('sim', password='sim')
+        self.client.force_login(self.user)
+        self.investment = Investment.objects.create(
+            user=self.user, starting_amount=1000, number_of_years=2,
+            return_rate=Decimal('6'), additional_contribution=100,
+            rate_type='CDI', rate_value=Decimal('10'),
+            rate_percentage=Decimal('100'))
+
+    def assertBands(self, result):
+        self.assertEqual(result['status'], 'done')
+        self.assertEqual(len(result['months']), 24)
+        for p5, p50, p95 in zip(result['p5'], result['p50'], result['p95']):
+            self.assertLessEqual(p5, p50)
+            self.assertLessEqual(p50, p95)
+
+    def test_inline(self):
+        response = self.client.get(
+            reverse('investment-simulation', args=[self.investment.pk]),
+            {'paths': PARALLEL_THRESHOLD})
+        self.assertEqual(response.status_code, 200)
+        self.assertBands(response.json())
+
+    def test_background_job(self):
+        response = self.client.get(reverse('portfolio-simulation'),
+                                   {'paths': PARALLEL_THRESHOLD + 1})
+        self.assertEqual(response.status_code, 202)
+        url = reverse('simulation-result', args=[response.json()['job']])
+
+        deadline = time.monotonic() + 120
+        result = self.client.get(url).json()
+        while result['status'] == 'running' and time.monotonic() < deadline:
+            time.sleep(0.2)
+            result = self.client.get(url).json()
+        self.assertBands(result)
+        self.assertNotIn('user', result)
+
+        self.client.force_login(User.objects.create_user('other', password='o'))
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.client.logout()
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.assertEqual(self.client.get(reverse(
+            'simulation-result', args=['unknown'])).status_code, 302)
+
+
+class ScheduleExportTest(TestCase):
+    """
+    The export has the SCHEDULE_COLUMNS header and one row per month of
+    each of the user's investments
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('export', password='export')
+        self.client.force_login(self.user)
+        self.investments = [Investment.objects.create(
+            user=self.user, title=f'inv {years}', starting_amount=1000,
+            number_of_years=years, return_rate=Decimal('12'),
+            starting_date=date(2024, 1, 1)) for years in (2, 1)]
+        Investment.objects.create(
+            user=User.objects.create_user('other', password='other'),
+            starting_amount=1000, number_of_years=5)
+
+    def export(self, name, *args):
+        response = self.client.get(reverse(name, args=args))
+        self.assertEqual(response.status_code, 200)
+        return response, list(csv.reader(io.StringIO(
+            b''.join(response.streaming_content).decode())))
+
+    def test_portfolio_csv(self):
+        response, rows = self.export('portfolio-schedule-export', 'csv')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn('portfolio-schedule.csv', response['Content-Disposition'])
+        self.assertEqual(tuple(rows[0]), SCHEDULE_COLUMNS)
+        months = {}
+        for row in rows[1:]:
+            months.setdefault(int(row[0]), []).append(row[2])
+        self.assertEqual({pk: len(dates) for pk, dates in months.items()},
+                         {self.investments[0].pk: 24, self.investments[1].pk: 12})
+        for dates in months.values():
+            self.assertEqual(len(set(dates)), len(dates))
+            self.assertEqual(dates[0], '2024-01-01')
+
+    def test_investment_csv(self):
+        investment = self.investments[1]
+        _, rows = self.export('investment-schedule-export', investment.pk, 'csv')
+        self.assertEqual(tuple(rows[0]), SCHEDULE_COLUMNS)
+        self.assertEqual(len(rows), 13)
+        self.assertEqual(rows[-1][4], str(investment.final_value()))
+
+
+class RateHistoryMixin:
+    """
+    Seeds one RateObservation per business day and makes the shared
+    RateIndex of the series forget it when the test ends
+    """
+
+    def seed_rates(self, series, start, end, value):
+        days = np.arange(np.datetime64(start), np.datetime64(end),
+                         dtype='datetime64[D]')
+        days = days[np.is_busday(days)]
+        RateObservation.objects.bulk_create(
+            RateObservation(series=series, date=day.item(), value=value)
+            for day in days)
+        bump_rate_index_version(series)
+        self.addCleanup(bump_rate_index_version, series)
+        return days
+
+
+class BacktestTest(RateHistoryMixin, TestCase):
+    """
+    Realised balances replay the stored series month by month; months the
+    series does not cover are left out
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('backtest', password='backtest')
+        self.client.force_login(self.user)
+
+    def investment(self, starting_date):
+        return Investment.objects.create(
+            user=self.user, starting_amount=Decimal('1000'),
+            additional_contribution=Decimal('100'), number_of_years=1,
+            return_rate=Decimal('1.2'), rate_type='cdi',
+            rate_value=Decimal('10'), rate_percentage=Decimal('110'),
+            starting_date=starting_date)
+
+    def get(self, investment):
+        response = self.client.get(
+            reverse('investment-backtest', args=[investment.pk]))
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_month_by_month(self):
+        days = self.seed_rates('cdi', '2024-01-01', '2024-04-10', '10.4')
+        investment = self.investment(date(2024, 1, 15))
+        result = self.get(investment)
+
+        # April is only partly stored, so January to March are replayed
+        self.assertEqual(result['months'], ['2024-01', '2024-02', '2024-03'])
+        self.assertEqual(result['starting_rate'], 10.4)
+        balance = 1000.0
+        for month, realised in zip(result['months'], result['realised']):
+            business_days = sum(str(day).startswith(month) for day in days)
+            cdi = 1.104 ** (business_days / 252) - 1
+            balance = balance * (1 + 0.001 + cdi * 1.1) + 100
+            self.assertAlmostEqual(realised, balance, places=2)
+        for month, projected in enumerate(result['projected'], start=1):
+            self.assertAlmostEqual(Decimal(str(projected)),
+                                   investment.value_at_month(month), places=2)
+        self.assertEqual(result['realised_final'], result['realised'][-1])
+        self.assertEqual(result['difference'], round(
+            result['realised'][-1] - result['projected'][-1], 2))
+
+    def test_starts_before_the_history(self):
+        self.seed_rates('cdi', '2024-01-01', '2024-04-10', '10.4')
+        result = self.get(self.investment(date(2023, 11, 1)))
+        self.assertEqual(result['months'], [])
+        self.assertIsNone(result['starting_rate'])
+        self.assertIsNone(result['difference'])
+
+    def test_no_history(self):
+        bump_rate_index_version('cdi')
+        self.addCleanup(bump_rate_index_version, 'cdi')
+        result = self.get(self.investment(date(2024, 1, 15)))
+        self.assertEqual(result['series'], 'cdi')
+        self.assertEqual((result['months'], result['realised'],
+                          result['projected']), ([], [], []))
+        for key in ('starting_rate', 'realised_final', 'projected_final',
+                    'difference'):
+            self.assertIsNone(result[key], key)
+
+
+class RateIndexTest(SimpleTestCase):
+    """
+    Binary-search lookups of RateIndex and the rebuilds of the registry
+    """
+
+    def setUp(self):
+        self.index = RateIndex(
+            [date(2024, 1, 5), date(2024, 1, 2), date(2024, 1, 3)],
+            [12.0, 10.0, 11.0])
+
+    def daily(self, *rates):
+        return math.prod((1 + rate / 100) ** (1 / 252) for rate in rates)
+
+    def test_rate_on(self):
+        self.assertIsNone(self.index.rate_on(date(2024, 1, 1)))
+        self.assertEqual(self.index.rate_on(date(2024, 1, 2)), 10.0)
+        self.assertEqual(self.index.rate_on(date(2024, 1, 3)), 11.0)
+        self.assertEqual(self.index.rate_on(date(2024, 1, 4)), 11.0)
+        self.assertEqual(self.index.rate_on(date(2030, 1, 1)), 12.0)
+        rates = self.index.rate_on(
+            [date(2024, 1, 1), date(2024, 1, 3), date(2024, 1, 4)])
+        self.assertTrue(np.isnan(rates[0]))
+        self.assertEqual(rates[1:].tolist(), [11.0, 11.0])
+
+    def test_factor_between(self):
+        factor = self.index.factor_between
+        # The start date is included and the end date is not
+        self.assertAlmostEqual(factor(date(2024, 1, 2), date(2024, 1, 5)),
+                               self.daily(10, 11))
+        self.assertAlmostEqual(factor(date(2024, 1, 3), date(2024, 1, 4)),
+                               self.daily(11))
+        self.assertAlmostEqual(factor(date(2023, 12, 1), date(2024, 1, 2)), 1.0)
+        self.assertAlmostEqual(factor(date(2024, 1, 1), date(2030, 1, 1)),
+                               self.daily(10, 11, 12))
+        self.assertEqual(factor(date(2024, 1, 4), date(2024, 1, 2)), 1.0)
+        factors = factor([date(2024, 1, 2), date(2024, 1, 5)],
+                         [date(2024, 1, 4), date(2024, 1, 2)])
+        self.assertAlmostEqual(factors[0], self.daily(10, 11))
+        self.assertEqual(factors[1], 1.0)
+
+    def test_empty(self):
+        index = RateIndex([], [])
+        self.assertEqual(len(index), 0)
+        self.assertIsNone(index.first_date)
+        self.assertEqual(index.factor_between(date(2024, 1, 1),
+                                              date(2024, 2, 1)), 1.0)
+
+    def test_registry_rebuilds_on_a_new_version(self):
+        versions = {'cdi': 1}
+        loaded = []
+        registry = RateIndexRegistry(
+            lambda series: loaded.append(series) or self.index, versions.get)
+        self.assertIs(registry.get('cdi'), self.index)
+        registry.get('cdi')
+        self.assertEqual(loaded, ['cdi'])
+        versions['cdi'] = 2
+        registry.get('cdi')
+        self.assertEqual(loaded, ['cdi', 'cdi'])
+
+
+class RateIndexSyncTest(RateHistoryMixin, TransactionTestCase):
+    """
+    The shared index follows the stored history after a sync and answers
+    the rate lookup view
+    """
+
+    def setUp(self):
+        cache.clear()
+        bcb_breaker.reset()
+        self.stub = StubSGS()
+        self.settings = override_settings(BCB_SGS_URL=self.stub.url)
+        self.settings.enable()
+        self.user = User.objects.create_user('rates', password='rates')
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        self.settings.disable()
+        self.stub.shutdown()
+        self.stub.server_close()
+
+    def test_sync_rebuilds_the_index(self):
+        days = self.seed_rates('cdi', '2023-12-01', '2024-01-01', '11.65')
+        index = get_rate_index('cdi')
+        self.assertEqual(len(index), len(days))
+        self.assertIs(get_rate_index('CDI'), index)
+
+        self.assertEqual(sync_rates(['cdi']), {'cdi': 2})
+        rebuilt = get_rate_index('cdi')
+        self.assertIsNot(rebuilt, index)
+        self.assertEqual(len(rebuilt), len(days) + 2)
+        self.assertEqual(rebuilt.last_date, date(2024, 1, 3))
+
+    def test_lookup_view(self):
+        self.seed_rates('cdi', '2024-01-01', '2024-02-01', '10')
+        url = reverse('rate-lookup', args=['cdi'])
+        result = self.client.get(url, {'date': '2023-12-31'}).json()
+        self.assertIsNone(result['rate'])
+        self.assertEqual(result['first_date'], '2024-01-01')
+        result = self.client.get(url, {'date': '2024-01-06', 'start': '2024-01-01',
+                                       'end': '2024-01-08'}).json()
+        self.assertEqual(result['rate'], 10.0)
+        self.assertAlmostEqual(result['factor'], 1.1 ** (5 / 252))
+        result = self.client.get(url, {'start': '2024-01-08',
+                                       'end': '2024-01-01'}).json()
+        self.assertEqual(result['factor'], 1.0)
+        self.assertEqual(
+            self.client.get(url, {'date': '01/01/2024'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse(
+            'rate-lookup', args=['ipca'])).status_code, 404)
+
+
+@override_settings(RATES_SOFT_TTL=3600, RATES_HARD_TTL=7 * 86400,
+                   RATES_BACKGROUND_REFRESH=False)
+class CentralBankRateTest(TestCase):
+    """
+    Stored rates are always served; a sync older than the soft TTL starts a
+    refresh and values older than the hard TTL are reported as unavailable
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    def observe(self, days_ago, value='10.40'):
+        for series in ('cdi', 'selic'):
+            RateObservation.objects.create(
+                series=series, date=date.today() - timedelta(days=days_ago),
+                value=Decimal(value))
+
+    def rates(self, synced_ago, **kwargs):
+        cache.set('rates_synced_at', time.time() - synced_ago, timeout=None)
+        with mock.patch('base.utils.refresh_rates_in_background') as refresh:
+            taxes = get_central_bank_rate(**kwargs)['taxes']
+        return {tax['name']: tax for tax in taxes}, refresh.called
+
+    def test_fresh(self):
+        self.observe(1)
+        rates, refreshed = self.rates(synced_ago=60)
+        self.assertFalse(refreshed)
+        self.assertEqual(rates['cdi'], {
+            'name': 'cdi', 'rate': '10.40', 'age': 1, 'available': True,
+            'date': (date.today() - timedelta(days=1)).strftime('%d/%m/%Y')})
+
+    def test_stale_is_served_with_its_age(self):
+        self.observe(3)
+        rates, refreshed = self.rates(synced_ago=7200)
+        self.assertTrue(refreshed)
+        self.assertEqual((rates['selic']['rate'], rates['selic']['age']),
+                         ('10.40', 3))
+        self.assertTrue(rates['selic']['available'])
+        self.assertFalse(self.rates(synced_ago=7200, refresh=False)[1])
+
+    def test_past_hard_ttl_is_unavailable(self):
+        self.observe(8)
+        rates, refreshed = self.rates(synced_ago=7200)
+        self.assertTrue(refreshed)
+        self.assertEqual((rates['cdi']['rate'], rates['cdi']['age']), (None, 8))
+        self.assertFalse(rates['cdi']['available'])
+        cache.set('rates_synced_at', time.time(), timeout=None)
+        self.assertEqual(dict(InvestmentForm().fields['rate_type'].choices), {
+            'cdi': ' CDI (rate unavailable)', 'selic': ' SELIC (rate unavailable)'})
+
+    def test_no_observations(self):
+        rates, _ = self.rates(synced_ago=60)
+        self.assertEqual((rates['cdi']['age'], rates['cdi']['date']), (None, None))
+        self.assertFalse(rates['cdi']['available'])
+
+    def test_background_refresh_can_be_disabled(self):
+        refresh_rates_in_background()
+        self.assertIsNone(cache.get('rates_refresh_started'))
+
+
+class RateDumpTest(TestCase):
+    """
+    sync_rates --file loads CSV and JSON dumps; loading one twice adds
+    nothing
+    """
+
+    def load(self, content, suffix, *args):
+        with tempfile.TemporaryDirectory() as directory:
+            path = f'{directory}/dump{suffix}'
+            with open(path, 'w', encoding='utf-8') as dump:
+                dump.write(content)
+            out = io.StringIO()
+            call_command('sync_rates', '--file', path, *args, stdout=out)
+        return out.getvalue()
+
+    def stored(self, series):
+        return list(RateObservation.objects.filter(series=series).values_list(
+            'date', 'value'))
+
+    def test_csv(self):
+        content = ('series;data;valor\n'
+                   'cdi;02/01/2024;11.65\n'
+                   'selic;2024-01-02;11.65\n'
+                   'cdi;03/01/2024;11.65\n')
+        self.assertEqual(self.load(content, '.csv'),
+                         'cdi: 2 observations\nselic: 1 observations\n')
+        self.assertEqual(self.stored('cdi'), [
+            (date(2024, 1, 2), Decimal('11.65')),
+            (date(2024, 1, 3), Decimal('11.65'))])
+        self.assertEqual(self.stored('selic'),
+                         [(date(2024, 1, 2), Decimal('11.65'))])
+
+        self.load(content, '.csv')
+        self.assertEqual(RateObservation.objects.count(), 3)
+
+    def test_json(self):
+        content = json.dumps([{'data': '02/01/2024', 'valor': '11.65'},
+                              {'data': '03/01/2024', 'valor': '11.15'}])
+        self.assertEqual(self.load(content, '.json', '--series', 'selic'),
+                         'selic: 2 observations\n')
+        self.load(content, '.json', '--series', 'selic')
+        self.assertEqual(self.stored('selic'), [
+            (date(2024, 1, 2), Decimal('11.65')),
+            (date(2024, 1, 3), Decimal('11.15'))])
+        self.assertEqual(self.stored('cdi'), [])
+
+    def test_unknown_series(self):
+        with self.assertRaisesMessage(CommandError, "Unknown series: 'ipca'"):
+            self.load('series,date,value\nipca,2024-01-02,0.4\n', '.csv')
+        with self.assertRaises(CommandError):
+            self.load('[]', '.json', '--series', 'cdi', '--series', 'selic')
+
+
+class PortfolioProjectionTest(TestCase):
+    """
+    Each investment enters the portfolio in the calendar month it starts and
+    the totals are the sum of each value_at_month
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('portfolio', password='portfolio')
+        self.client.force_login(self.user)
+        self.monthly = Investment.objects.create(
+            user=self.user, starting_amount=Decimal('1000'), number_of_years=1,
+            return_rate=Decimal('12'), additional_contribution=Decimal('100'),
+            starting_date=date(2024, 1, 10))
+        self.monthly.tags.add(InvestmentTag.objects.create(
+            user=self.user, name='monthly'))
+        self.later = Investment.objects.create(
+            user=self.user, starting_amount=Decimal('5000'), number_of_years=2,
+            rate_type='cdi', rate_value=Decimal('10.65'),
+            rate_percentage=Decimal('110'), starting_date=date(2024, 4, 20))
+
+    def expected(self, investment, column, first_month):
+        month = column - first_month + 1
+        return investment.value_at_month(month) if month > 0 else Decimal('0')
+
+    def test_calendar_months_and_totals(self):
+        result = self.client.get(reverse('portfolio-projection')).json()
+        # April 2024 plus 24 months is the last month of the later plan
+        self.assertEqual(result['months'][0], '2024-01')
+        self.assertEqual(result['months'][-1], '2026-03')
+        self.assertEqual(len(result['months']), 27)
+        self.assertEqual(result['months'][3], '2024-04')
+
+        for column, total in enumerate(result['total']):
+            monthly = self.expected(self.monthly, column, 0)
+            later = self.expected(self.later, column, 3)
+            # The total is rounded once, the two values one each
+            self.assertAlmostEqual(Decimal(str(total)), monthly + later,
+                                   delta=Decimal('0.01'),
+                                   msg=result['months'][column])
+            self.assertAlmostEqual(
+                Decimal(str(result['tags']['monthly'][column])), monthly,
+                places=2)
+
+        self.assertEqual(result['total'][2], float(self.monthly.value_at_month(3)))
+        self.assertEqual(result['tags']['monthly'][-1],
+                         float(self.monthly.final_value()))
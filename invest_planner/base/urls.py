@@ -2,7 +2,14 @@
 Define URLs for Base module
 """
 from django.urls import path
-from .views import InvestmentList, InvestmentDetail
+from .views import InvestmentList, InvestmentDetail, PortfolioProjectionView
+from .views import SimulationView, simulation_result
+from .views import ProjectionCacheStatsView, ScheduleExportView
+from .views import RatesBreakerStatsView
+from .views import InvestmentScheduleView, GoalSeekView, GoalSeekApiView
+from .views import InvestmentBacktestView, SweepView, RateLookupView
+from .views import SearchView, SearchAutocompleteView, ImportView
+from .views import BulkActionView
 from .views import InvestmentCreate, InvestmentUpdate, InvestmentDelete
 from .views import IncomeList, IncomeCreate, IncomeUpdate, IncomeDelete
 from .views import ExpenseList, ExpenseCreate, ExpenseUpdate, ExpenseDelete
@@ -19,6 +26,34 @@ from .views import notifications_view, mark_as_read
 urlpatterns = [
     path('', InvestmentList.as_view(), name='investments'),
     path('investment/<int:pk>/', InvestmentDetail.as_view(), name='investment'),
+    path('portfolio/projection/', PortfolioProjectionView.as_view(),
+         name='portfolio-projection'),
+    path('simulation/', SimulationView.as_view(), name='portfolio-simulation'),
+    path('investment/<int:pk>/simulation/', SimulationView.as_view(),
+         name='investment-simulation'),
+    path('simulation/<str:job_id>/', simulation_result,
+         name='simulation-result'),
+    path('projection-cache/', ProjectionCacheStatsView.as_view(),
+         name='projection-cache'),
+    path('rates-breaker/', RatesBreakerStatsView.as_view(),
+         name='rates-breaker'),
+    path('investment/<int:pk>/backtest/', InvestmentBacktestView.as_view(),
+         name='investment-backtest'),
+    path('investment/<int:pk>/schedule/', InvestmentScheduleView.as_view(),
+         name='investment-schedule'),
+    path('investment/<int:pk>/schedule.<str:fmt>', ScheduleExportView.as_view(),
+         name='investment-schedule-export'),
+    path('portfolio/schedule.<str:fmt>', ScheduleExportView.as_view(),
+         name='portfolio-schedule-export'),
+    path('rates/<str:series>/', RateLookupView.as_view(), name='rate-lookup'),
+    path('bulk/<str:kind>/', BulkActionView.as_view(), name='bulk-action'),
+    path('import/', ImportView.as_view(), name='import'),
+    path('search/', SearchView.as_view(), name='search'),
+    path('search/autocomplete/', SearchAutocompleteView.as_view(),
+         name='search-autocomplete'),
+    path('sweep/', SweepView.as_view(), name='sweep'),
+    path('goal-seek/', GoalSeekView.as_view(), name='goal-seek'),
+    path('goal-seek/api/', GoalSeekApiView.as_view(), name='goal-seek-api'),
     path('investment-create/', InvestmentCreate.as_view(),
          name='investment-create'),
     path('investment-update/<int:pk>/',
@@ -1,67 +1,461 @@
 """
 Funções adicionais do programa
 """
+import csv
 import json
+import logging
+import threading
 from abc import ABC, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
+from time import monotonic, sleep, time
+from uuid import uuid4
 from django.db.models.signals import post_save
-from datetime import date
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from django.db.models import Max
 from .models import Investment, Notification
 from django.dispatch import receiver
 import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
 from django.core.cache import cache
-from .models import Investment, Income, Expense
+from django.db import connection
+from .models import Investment, Income, Expense, RateObservation
 from django.utils.timezone import now
 from decouple import config
 from groq import Groq
 from gpt4all import GPT4All
+from .simulation import default_rate_model, fit_rate_model, simulate
+from .simulation import PARALLEL_THRESHOLD
+from .projection import projection_cache, portfolio_summary, PORTFOLIO_FIELDS
+from .rates import RateIndex, RateIndexRegistry, SGS_SERIES
+from .search import tag_names
+from .breaker import CircuitBreaker
+from .signals import bump_user_cache_version, user_cache_version
 
 
-def get_central_bank_rate():
-    """Recebe os dados da API do banco central
+logger = logging.getLogger(__name__)
+
+SGS_URL = "https://api.bcb.gov.br/dados/serie/bcdata.sgs.{code}/dados"
+HISTORY_START = date(2000, 1, 1)
+MAX_REQUEST_DAYS = 3650
+SINGLE_FLIGHT_TIMEOUT = 120
+
+_http_session = None
+_http_session_lock = threading.Lock()
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+_store_lock = threading.Lock()
+
+bcb_breaker = CircuitBreaker(
+    'bcb_sgs',
+    failure_threshold=getattr(settings, 'BCB_BREAKER_FAILURES', 3),
+    reset_timeout=getattr(settings, 'BCB_BREAKER_RESET', 30))
+
+
+def http_session():
+    """Sessão HTTP compartilhada, com conexões keep-alive reaproveitadas
+    """
+    global _http_session  # pylint: disable=global-statement
+    with _http_session_lock:
+        if _http_session is None:
+            adapter = HTTPAdapter(pool_connections=len(SGS_SERIES),
+                                  pool_maxsize=2 * len(SGS_SERIES))
+            _http_session = requests.Session()
+            _http_session.mount('http://', adapter)
+            _http_session.mount('https://', adapter)
+    return _http_session
+
+
+def single_flight(key, function, timeout=SINGLE_FLIGHT_TIMEOUT):
+    """Executa function uma única vez por chave entre threads e workers
+
+    Threads of this process that call with the same key while it runs get
+    the same result. Other workers are held off by a lock in the shared
+    cache; when this worker finds the lock taken it waits for it to be
+    released and returns None, as the other worker already did the work.
+    """
+    with _in_flight_lock:
+        future = _in_flight.get(key)
+        leader = future is None
+        if leader:
+            future = _in_flight[key] = Future()
+    if not leader:
+        return future.result(timeout=timeout)
+
+    lock_key = f'single_flight:{key}'
+    try:
+        if cache.add(lock_key, True, timeout=timeout):
+            try:
+                result = function()
+            finally:
+                cache.delete(lock_key)
+        else:
+            deadline = monotonic() + timeout
+            while cache.get(lock_key) and monotonic() < deadline:
+                sleep(0.1)
+            result = None
+        future.set_result(result)
+        return result
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _in_flight_lock:
+            del _in_flight[key]
+
+
+def get_central_bank_rate(refresh=True):
+    """Última taxa conhecida de cada série do banco central (stale-while-revalidate)
+
+    The last stored values are always served at once, with their age in
+    days. When the last sync is older than RATES_SOFT_TTL a refresh starts on
+    a background thread, unless ``refresh`` is False. Values older than
+    RATES_HARD_TTL are reported as unavailable (rate None) instead of raising.
 
     Returns:
         dict[str, list[dict[str, Unknown]]]: context
     """
-    url_cdi = "https://api.bcb.gov.br/dados/serie/bcdata.sgs.4389/dados/ultimos/1?formato=json"
-    url_selic = "https://api.bcb.gov.br/dados/serie/bcdata.sgs.1178/dados/ultimos/1?formato=json"
+    latest = cache.get('central_bank_rates')
+    if latest is None:
+        latest = {}
+        for name in SGS_SERIES:
+            observation = RateObservation.objects.filter(
+                series=name).order_by('-date').first()
+            latest[name] = (observation.date, observation.value) \
+                if observation else None
+        cache.set('central_bank_rates', latest, timeout=None)
+
+    synced_at = cache.get('rates_synced_at')
+    soft_ttl = getattr(settings, 'RATES_SOFT_TTL', 6 * 3600)
+    if refresh and (synced_at is None or time() - synced_at > soft_ttl):
+        refresh_rates_in_background()
+
+    hard_ttl = getattr(settings, 'RATES_HARD_TTL', 7 * 86400)
+    taxes = []
+    for name, observation in latest.items():
+        age = (date.today() - observation[0]).days if observation else None
+        available = age is not None and age * 86400 <= hard_ttl
+        taxes.append({
+            'name': name,
+            'rate': f"{observation[1]:.2f}" if available else None,
+            'date': observation[0].strftime('%d/%m/%Y') if observation else None,
+            'age': age,
+            'available': available,
+        })
+    return {'taxes': taxes}
+
+
+def refresh_rates_in_background():
+    """Dispara sync_rates numa thread, no máximo uma vez por minuto
+    """
+    if not getattr(settings, 'RATES_BACKGROUND_REFRESH', True) or \
+            not cache.add('rates_refresh_started', True, timeout=60):
+        return
 
-    def fetch_rate(url, cache_key_rate, cache_key_date):
-        """Executa as chamadas http
-        """
-        rate, date = None, None
+    def run():
         try:
-            response = requests.get(url, timeout=20)
-        except requests.exceptions.Timeout:
-            print("Timed out")
-
-        if response.status_code == 200:
-            data = response.json()
-            if data:
-                rate = data[-1]['valor']
-                date = data[-1]['data']
-                cache.set(cache_key_rate, rate, timeout=86400)
-                cache.set(cache_key_date, date, timeout=86400)
-        return rate, date
-
-    cdi_rate, cdi_date = cache.get('cdi_rate'), cache.get('cdi_date')
-    if cdi_rate is None or cdi_date is None:
-        cdi_rate, cdi_date = fetch_rate(url_cdi, 'cdi_rate', 'cdi_date')
-
-    selic_rate, selic_date = cache.get('selic_rate'), cache.get('selic_date')
-    if selic_rate is None or selic_date is None:
-        selic_rate, selic_date = fetch_rate(
-            url_selic, 'selic_rate', 'selic_date')
-
-    context = {
-        'taxes': [
-            {'name': 'cdi', 'rate': cdi_rate, 'date': cdi_date},
-            {'name': 'selic', 'rate': selic_rate, 'date': selic_date}
-        ]
-    }
-    return context
+            sync_rates()
+        except Exception:  # pylint: disable=broad-exception-caught
+            logger.exception('Rate refresh failed')
+        finally:
+            connection.close()
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def is_service_failure(error):
+    """Erros que indicam falha do SGS, e não da requisição feita
+    """
+    if isinstance(error, requests.exceptions.HTTPError):
+        return error.response is None or error.response.status_code >= 500 \
+            or error.response.status_code == 429
+    return isinstance(error, (requests.exceptions.RequestException, ValueError))
+
+
+def fetch_rate(series, start_date=None, end_date=None):
+    """Busca observações de uma série no SGS do banco central
+
+    Without dates only the latest observation is requested. Calls go through
+    bcb_breaker, so while the API is failing this raises CircuitOpenError at
+    once instead of waiting for the timeout.
+
+    Returns:
+        list[tuple[date, Decimal]]: observations, oldest first
+    """
+    return bcb_breaker.call(_fetch_rate, series, start_date, end_date,
+                            is_failure=is_service_failure)
+
+
+def _fetch_rate(series, start_date, end_date):
+    url = getattr(settings, 'BCB_SGS_URL', SGS_URL).format(
+        code=SGS_SERIES[series])
+    params = {'formato': 'json'}
+    if start_date is None:
+        url += '/ultimos/1'
+    else:
+        params['dataInicial'] = start_date.strftime('%d/%m/%Y')
+        params['dataFinal'] = (end_date or date.today()).strftime('%d/%m/%Y')
+
+    response = http_session().get(url, params=params, timeout=getattr(
+        settings, 'BCB_SGS_TIMEOUT', (5, 20)))
+    if response.status_code == 404:
+        # O SGS responde 404 quando não há dados no período
+        return []
+    response.raise_for_status()
+    return [parse_observation(row['data'], row['valor'])
+            for row in response.json()]
+
+
+def parse_observation(day, value):
+    """Converte data (dd/mm/aaaa ou ISO) e valor de uma observação
+    """
+    for date_format in ('%d/%m/%Y', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(day, date_format).date(), Decimal(value)
+        except ValueError:
+            continue
+    raise ValueError(f"Invalid date: {day}")
+
+
+def store_observations(series, observations, batch_size=1000):
+    """Insere observações em lote, ignorando datas já salvas
+
+    Returns:
+        int: number of observations sent to the database
+    """
+    RateObservation.objects.bulk_create(
+        (RateObservation(series=series, date=day, value=value)
+         for day, value in observations),
+        batch_size=batch_size, ignore_conflicts=True)
+    return len(observations)
+
+
+def next_sync_date(name, since=None):
+    """Primeira data ainda não salva da série
+    """
+    latest = RateObservation.objects.filter(
+        series=name).aggregate(Max('date'))['date__max']
+    return latest + timedelta(days=1) if latest else since or HISTORY_START
+
+
+def sync_series(name, start):
+    """Busca e salva as observações de uma série a partir de start
+
+    Returns:
+        int: observations fetched
+    """
+    today = date.today()
+    observations = []
+    while start <= today:
+        end = min(start + timedelta(days=MAX_REQUEST_DAYS), today)
+        observations += fetch_rate(name, start, end)
+        start = end + timedelta(days=1)
+    with _store_lock:
+        fetched = store_observations(name, observations)
+    if fetched:
+        cache.delete('central_bank_rates')
+        bump_rate_index_version(name)
+        projection_cache.invalidate_rate_type(name)
+    return fetched
+
+
+def sync_rates(series=None, since=None):
+    """Sincroniza as séries em paralelo, uma busca por série de cada vez
+
+    The HTTP requests of each series run on their own thread through
+    single_flight, so callers that arrive while a series is already being
+    synced wait for that sync instead of starting another one. Database
+    writes are serialized, as SQLite allows a single writer.
+
+    Returns:
+        dict[str, int]: observations fetched per series
+    """
+    names = list(series or SGS_SERIES)
+    starts = {name: next_sync_date(name, since) for name in names}
+
+    def run(name):
+        try:
+            return single_flight(
+                f'sync_rates:{name}',
+                lambda: sync_series(name, starts[name])) or 0
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=len(names)) as pool:
+        fetched = dict(zip(names, pool.map(run, names)))
+    cache.set('rates_synced_at', time(), timeout=None)
+    return fetched
+
+
+def load_rate_dump(path, series=None, batch_size=5000):
+    """Carrega observações de um arquivo CSV ou JSON
+
+    CSV files need a header with date/data and value/valor columns, JSON
+    files a list of objects with the same keys (the SGS API format). A
+    series column/key is optional when ``series`` is given.
+
+    Returns:
+        dict[str, int]: observations read per series
+    """
+    loaded = {}
+    batches = {}
+
+    def flush(name):
+        loaded[name] = loaded.get(name, 0) + store_observations(
+            name, batches.pop(name, []), batch_size)
+
+    with open(path, newline='', encoding='utf-8') as dump:
+        if str(path).lower().endswith('.json'):
+            records = json.load(dump)
+        else:
+            sample = dump.read(4096)
+            dump.seek(0)
+            records = csv.DictReader(
+                dump, dialect=csv.Sniffer().sniff(sample, delimiters=',;'))
+        for record in records:
+            name = (record.get('series') or series or '').lower()
+            if name not in SGS_SERIES:
+                raise ValueError(f"Unknown series: {name!r}")
+            batches.setdefault(name, []).append(parse_observation(
+                record.get('date') or record['data'],
+                record.get('value') or record['valor']))
+            if len(batches[name]) >= batch_size:
+                flush(name)
+    for name in list(batches):
+        flush(name)
+    cache.delete('central_bank_rates')
+    for name in loaded:
+        bump_rate_index_version(name)
+        projection_cache.invalidate_rate_type(name)
+    return loaded
+
+
+def load_rate_index(series):
+    """Monta o RateIndex da série a partir das observações salvas
+    """
+    observations = list(RateObservation.objects.filter(
+        series=series).order_by('date').values_list('date', 'value'))
+    return RateIndex([row[0] for row in observations],
+                     [row[1] for row in observations])
+
+
+def rate_index_version(series):
+    return cache.get(f'rate_index_version:{series}')
+
+
+def bump_rate_index_version(series):
+    """Faz todos os workers reconstruírem o índice da série
+    """
+    cache.set(f'rate_index_version:{series}', uuid4().hex, timeout=None)
+    rate_indexes.invalidate(series)
+
+
+rate_indexes = RateIndexRegistry(load_rate_index, rate_index_version)
+
+
+def get_rate_index(series):
+    """RateIndex compartilhado da série, carregado na primeira consulta
+
+    Returns:
+        RateIndex | None: index for 'cdi' or 'selic', None for other series
+    """
+    if not series or series.lower() not in SGS_SERIES:
+        return None
+    return rate_indexes.get(series.lower())
+
+
+_simulation_jobs = ThreadPoolExecutor(max_workers=2)
+MIN_MODEL_MONTHS = 24
+
+
+def get_rate_models(rows):
+    """Modelo de taxa para cada rate_type usado pelos investimentos
+
+    Fitted to the monthly history of the stored series when there are at
+    least MIN_MODEL_MONTHS of it, otherwise centred on the rate_value of the
+    investments.
+
+    Returns:
+        dict[str, RateModel]: model per lowercase rate_type
+    """
+    snapshots = {}
+    for row in rows:
+        if row['rate_type'] and row['rate_value']:
+            snapshots.setdefault(row['rate_type'].lower(), []).append(
+                float(row['rate_value']))
+
+    models = {}
+    for name, values in snapshots.items():
+        index = get_rate_index(name)
+        history = index.monthly_values() if index is not None else []
+        if len(history) >= MIN_MODEL_MONTHS:
+            models[name] = fit_rate_model(history)
+        else:
+            models[name] = default_rate_model(sum(values) / len(values))
+    return models
+
+
+def start_simulation(user, rows, paths):
+    """Executa a simulação fora da thread da requisição
+
+    Small simulations run inline. Larger ones are handed to a background
+    thread that fans out to the process pool and stores the result in the
+    cache under the returned job id. The job state lives only in the cache,
+    so any web worker sharing it can answer the polls (not 'locmem').
+
+    Returns:
+        tuple[str | None, dict | None]: job id, or the result when run inline
+    """
+    models = get_rate_models(rows)
+    if paths <= PARALLEL_THRESHOLD:
+        return None, simulate(rows, models, paths)
+
+    job_id = uuid4().hex
+    cache_key = f'simulation:{job_id}'
+    cache.set(cache_key, {'user': user.pk, 'status': 'running'}, timeout=3600)
+
+    def run():
+        try:
+            result = {'status': 'done', **simulate(rows, models, paths)}
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            result = {'status': 'error', 'error': str(e)}
+        cache.set(cache_key, {'user': user.pk, **result}, timeout=3600)
+
+    _simulation_jobs.submit(run)
+    return job_id, None
+
+
+def get_simulation(user, job_id):
+    """Estado ou resultado de uma simulação em background
+
+    Returns:
+        dict | None: None when the job is unknown, expired or not the user's
+    """
+    job = cache.get(f'simulation:{job_id}')
+    if job is None or job.pop('user') != user.pk:
+        return None
+    return job
+
+
+USER_DATA_FIELDS = {
+    Investment: ('id', 'title', 'starting_amount', 'number_of_years',
+                 'return_rate', 'additional_contribution', 'rate_type',
+                 'rate_value', 'rate_percentage', 'active', 'starting_date'),
+    Income: ('id', 'title', 'monthly_income'),
+    Expense: ('id', 'title', 'monthly_expense'),
+}
 
 
 def get_user_data(user):
+    """Dados do usuário para o chatbot e a página de resumo
+
+    One values() query per model plus one tag query per model, whatever the
+    number of rows.
+
+    Returns:
+        dict[str, list[dict]]: investments, income and expenses
+    """
     customer_data = {
         # "name": user.username,
         # "email": user.email,
@@ -70,42 +464,81 @@ def get_user_data(user):
         "expenses": []
     }
 
-    investments = Investment.objects.filter(user=user)
-    for investment in investments:
+    tags = tag_names(Investment, user=user)
+    for row in Investment.objects.filter(user=user).values(
+            *USER_DATA_FIELDS[Investment]):
+        investment = Investment(**row)
         customer_data["investments"].append({
-            "title": investment.title,
-            "starting_amount": float(investment.starting_amount),
-            "number_of_years": str(investment.number_of_years),
-            "return_rate": float(investment.return_rate),
-            "additional_contribution": float(investment.additional_contribution),
-            "rate_type": str(investment.rate_type),
-            "rate_value": float(investment.rate_value),
-            "rate_percentage": float(investment.rate_percentage),
-            "active": bool(investment.active),
-            "starting_date": str(investment.starting_date),
-            "tags": [tag.name for tag in investment.tags.all()],
-
+            "title": row['title'],
+            "starting_amount": float(row['starting_amount']),
+            "number_of_years": str(row['number_of_years']),
+            "return_rate": float(row['return_rate']),
+            "additional_contribution": float(row['additional_contribution']),
+            "rate_type": str(row['rate_type']),
+            "rate_value": float(row['rate_value']),
+            "rate_percentage": float(row['rate_percentage']),
+            "active": bool(row['active']),
+            "starting_date": str(row['starting_date']),
+            "final_value": float(investment.final_value()),
+            "total_contributed": float(investment.total_contributed()),
+            "tags": tags[row['id']],
         })
 
-    incomes = Income.objects.filter(user=user)
-    for income in incomes:
+    tags = tag_names(Income, user=user)
+    for row in Income.objects.filter(user=user).values(*USER_DATA_FIELDS[Income]):
         customer_data["income"].append({
-            "title": income.title,
-            "monthly_income": float(income.monthly_income),
-            "tags": [tag.name for tag in income.tags.all()]
+            "title": row['title'],
+            "monthly_income": float(row['monthly_income']),
+            "tags": tags[row['id']],
         })
 
-    expenses = Expense.objects.filter(user=user)
-    for expense in expenses:
+    tags = tag_names(Expense, user=user)
+    for row in Expense.objects.filter(user=user).values(*USER_DATA_FIELDS[Expense]):
         customer_data["expenses"].append({
-            "title": expense.title,
-            "monthly_expense": float(expense.monthly_expense),
-            "tags": [tag.name for tag in expense.tags.all()]
+            "title": row['title'],
+            "monthly_expense": float(row['monthly_expense']),
+            "tags": tags[row['id']],
         })
 
     return customer_data
 
 
+def get_user_data_json(user):
+    """get_user_data já codificado em JSON, em cache pela versão do usuário
+
+    Saves and deletes bump the version, so repeated calls cost no queries
+    until the user's data changes.
+
+    Returns:
+        bytes: UTF-8 JSON, indented for display
+    """
+    key = f'user_data:{user.pk}:{user_cache_version(user.pk)}'
+    encoded = cache.get(key)
+    if encoded is None:
+        encoded = json.dumps(get_user_data(user), indent=4).encode()
+        cache.set(key, encoded, timeout=getattr(
+            settings, 'USER_CACHE_TIMEOUT', 86400))
+    return encoded
+
+
+def get_portfolio_summary(user):
+    """Projeção combinada do portfólio do usuário, em cache por versão
+
+    Returns:
+        dict: portfolio_summary of the user's investments
+    """
+    key = f'portfolio:{user.pk}:{user_cache_version(user.pk)}'
+    summary = cache.get(key)
+    if summary is None:
+        rows = list(Investment.objects.filter(
+            user=user).values(*PORTFOLIO_FIELDS))
+        tags = tag_names(Investment, user=user)
+        summary = portfolio_summary(rows, [tags[row['id']] for row in rows])
+        cache.set(key, summary, timeout=getattr(
+            settings, 'USER_CACHE_TIMEOUT', 86400))
+    return summary
+
+
 @receiver(post_save, sender=Investment)
 def check_investment_end_date(sender, instance, **kwargs):
     end_date = instance.calculate_end_date()
@@ -114,7 +547,8 @@ def check_investment_end_date(sender, instance, **kwargs):
         Notification.objects.create(
             user=instance.user,
             message=f"Your investment '{
-                instance.title}' has reached its end date.",
+                instance.title}' has reached its end date with R$ {
+                instance.final_value()}.",
         )
 
 
@@ -9,77 +9,100 @@ from .utils import get_user_data  # Função para obter os dados do usuário
 from django.shortcuts import redirect, get_object_or_404
 from .models import Notification
 from .models import Investment, Income, Expense
+import csv
+import io
 import json
-from django.http import JsonResponse
+import math
+from django.http import JsonResponse, StreamingHttpResponse, Http404
+from django.core.serializers.json import DjangoJSONEncoder
 from decimal import Decimal
 from datetime import date, datetime
-from django.db.models import Q, Sum
 from django.shortcuts import render
+from django.db.models import Q
 from django.views import View
 from django.views.generic.list import ListView
 from django.views.generic.detail import DetailView
-from django.views.generic.edit import CreateView, UpdateView, DeleteView
-from django.urls import reverse_lazy
-from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import Case, When, Value, IntegerField
+from django.views.generic.edit import CreateView, UpdateView, DeleteView, FormView
+from django.urls import reverse, reverse_lazy
+from django.contrib.auth.decorators import login_required
+from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from .models import Investment, Income, Expense, Tag
 from .models import InvestmentTag, IncomeTag, ExpenseTag
 from .forms import InvestmentTagForm, IncomeTagForm, ExpenseTagForm
-from .forms import InvestmentForm
-from .utils import get_central_bank_rate, get_user_data
+from .forms import InvestmentForm, GoalSeekForm, ImportForm
+from .importer import format_for, import_rows
+from . import bulk
+from .utils import get_central_bank_rate, get_user_data, get_user_data_json
+from .utils import start_simulation, get_simulation, get_rate_index
+from .utils import bcb_breaker, get_portfolio_summary
+from .snapshots import get_snapshot
+from .backtest import backtest
+from .projection import cached_window, PORTFOLIO_FIELDS
+from .projection import projection_cache, iter_schedule, month_offset
+from .projection import finite_or_none, sweep, SWEEP_FIELDS
+from .search import autocomplete, filter_queryset, search
+from .pagination import InvalidCursor, KeysetPaginator, KeysetPaginationMixin
 
 # pylint: disable=too-many-ancestors
 
 
-class InvestmentList(LoginRequiredMixin, ListView):
+class BulkActionsMixin:
     """
-    Main View: list of investments
+    Adds the kind and the tags offered by the bulk action form of a list
+    """
+    bulk_kind = None
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        tag_model = bulk.BULK_KINDS[self.bulk_kind].tags.field.related_model
+        context['bulk_kind'] = self.bulk_kind
+        context['bulk_tags'] = tag_model.objects.filter(
+            Q(user=self.request.user) | Q(user=None)).order_by('name')
+        return context
+
+
+class InvestmentList(LoginRequiredMixin, BulkActionsMixin, KeysetPaginationMixin,
+                     ListView):
+    """
+    Main View: list of investments, one keyset page at a time
     """
     model = Investment
     context_object_name = 'investments'
+    ordering_keys = ('-active', '-starting_date', '-id')
+    bulk_kind = 'investment'
 
     def get_queryset(self):
         """
         Returns investments filtered by the current user, ordered by
         active status (active first) and then by starting_date (latest first).
         """
-        queryset = Investment.objects.filter(user=self.request.user)
-        queryset = queryset.order_by(
-            Case(
-                When(active=True, then=Value(0)),
-                default=Value(1),
-                output_field=IntegerField()
-            ),
-            '-starting_date'
-        )
+        queryset = Investment.objects.filter(
+            user=self.request.user).prefetch_related('tags')
+        queryset = queryset.order_by(*self.ordering_keys)
 
         search_input = self.request.GET.get('search_box') or ''
         if search_input:
-            queryset = queryset.filter(
-                Q(title__icontains=search_input) | Q(
-                    tags__name__icontains=search_input)
-            ).distinct()
+            queryset = filter_queryset(queryset, self.request.user, search_input)
         return queryset
 
     def get_context_data(self, **kwargs):
+        """
+        Dashboard data in a fixed number of queries: the list, its tags
+        and the user's UserFinancialSnapshot row.
+        """
         context = super().get_context_data(**kwargs)
-        context['count'] = self.get_queryset().filter(active=True).count()
+        investments = context['investments']
         search_input = self.request.GET.get('search_box') or ''
         context['search_input'] = search_input
 
-        total_investment_value = Investment.objects.filter(user=self.request.user).aggregate(
-            Sum('starting_amount'))['starting_amount__sum'] or 0
-        context['total_investment_value'] = total_investment_value
-
-        monthly_income = Income.objects.filter(user=self.request.user).aggregate(
-            Sum('monthly_income'))['monthly_income__sum'] or 0
-        context['monthly_income'] = monthly_income
+        snapshot = get_snapshot(self.request.user)
+        context['snapshot'] = snapshot
+        context['count'] = snapshot.active_count
+        context['total_investment_value'] = snapshot.total_invested
+        context['monthly_income'] = snapshot.monthly_income
+        context['monthly_expense'] = snapshot.monthly_expense
 
-        monthly_expense = Expense.objects.filter(user=self.request.user).aggregate(
-            Sum('monthly_expense'))['monthly_expense__sum'] or 0
-        context['monthly_expense'] = monthly_expense
-
-        for investment in context['investments']:
+        for investment in investments:
             investment.total_monthly_income = investment.calculate_monthly_income()
             investment.end_date = investment.calculate_end_date()
 
@@ -92,53 +115,438 @@ class InvestmentDetail(LoginRequiredMixin, DetailView):
     """
     model = Investment
     context_object_name = 'investment'
+    page_size = 24
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        investment = self.get_object()
-
-        return_rate = getattr(investment, 'return_rate', Decimal('0.00'))
-        rate_percentage = getattr(
-            investment, 'rate_percentage', Decimal('0.00'))
-        rate_value = getattr(investment, 'rate_value', Decimal('0.00'))
-
-        months = []
-        total_amount = getattr(investment, 'starting_amount', Decimal('0.00'))
-        current_date = getattr(
-            investment, 'starting_date', datetime.today().date()).replace(day=1)
-
-        for _ in range(getattr(investment, 'number_of_years', 0) * 12):
-            fixed_return = total_amount * return_rate / \
-                Decimal('100') / Decimal('12')
-
-            if getattr(investment, 'rate_type') and rate_percentage and rate_value:
-                variable_return = total_amount * \
-                    (rate_value * rate_percentage / Decimal('100')) / \
-                    Decimal('100') / Decimal('12')
+        investment = self.object
+
+        context['months'] = cached_window(investment, 0, self.page_size)
+        context['total_result'] = investment.final_value()
+        context['next_offset'] = len(context['months'])
+        context['has_more'] = investment.total_months > context['next_offset']
+        context['page_size'] = self.page_size
+
+        return context
+
+
+class InvestmentScheduleView(LoginRequiredMixin, View):
+    """
+    JSON page of the monthly schedule, selected with ?offset=&limit= or
+    ?from=YYYY-MM&to=YYYY-MM
+    """
+    default_limit = 24
+    max_limit = 600
+
+    def get(self, request, pk):
+        investment = get_object_or_404(
+            Investment, pk=pk, user=request.user)
+        total = investment.total_months
+        try:
+            offset, limit = self.get_window(request.GET, investment)
+        except ValueError:
+            return JsonResponse(
+                {'error': 'Use offset/limit as integers or from/to as YYYY-MM.'},
+                status=400)
+
+        limit = min(max(limit, 0), self.max_limit)
+        offset = min(max(offset, 0), total)
+        rows = cached_window(investment, offset, limit)
+        next_offset = offset + len(rows)
+        return JsonResponse({
+            'offset': offset,
+            'total': total,
+            'next_offset': next_offset if next_offset < total else None,
+            'rows': [row._asdict() for row in rows],
+        })
+
+    def get_window(self, params, investment):
+        """Converte os parâmetros da requisição em offset e limit
+        """
+        if 'from' in params or 'to' in params:
+            offset, last = 0, investment.total_months - 1
+            if params.get('from'):
+                start = datetime.strptime(params['from'], '%Y-%m')
+                # Months before the start are not in the schedule
+                offset = max(month_offset(investment, start.year, start.month), 0)
+            if params.get('to'):
+                end = datetime.strptime(params['to'], '%Y-%m')
+                last = month_offset(investment, end.year, end.month)
+            return offset, last - offset + 1
+        return (int(params.get('offset', 0)),
+                int(params.get('limit', self.default_limit)))
+
+
+class PortfolioProjectionView(LoginRequiredMixin, View):
+    """
+    JSON with the combined monthly projection of all user investments
+    """
+
+    def get(self, request):
+        return JsonResponse(get_portfolio_summary(request.user))
+
+
+class SimulationView(LoginRequiredMixin, View):
+    """
+    Monte Carlo percentile bands for one investment or the whole portfolio
+    """
+    max_paths = 50000
+
+    def get(self, request, pk=None):
+        queryset = Investment.objects.filter(user=request.user)
+        if pk is not None:
+            queryset = queryset.filter(pk=pk)
+        rows = list(queryset.values(*PORTFOLIO_FIELDS))
+        if pk is not None and not rows:
+            return JsonResponse({'error': 'Investment not found.'}, status=404)
+
+        try:
+            paths = int(request.GET.get('paths', 1000))
+        except ValueError:
+            return JsonResponse({'error': 'paths must be an integer.'}, status=400)
+        paths = min(max(paths, 1), self.max_paths)
+
+        job_id, result = start_simulation(request.user, rows, paths)
+        if job_id is None:
+            return JsonResponse({'status': 'done', **result})
+        return JsonResponse({'status': 'running', 'job': job_id}, status=202)
+
+
+@login_required
+def simulation_result(request, job_id):
+    result = get_simulation(request.user, job_id)
+    if result is None:
+        return JsonResponse({'error': 'Simulation not found.'}, status=404)
+    return JsonResponse(result)
+
+
+class ProjectionCacheStatsView(UserPassesTestMixin, View):
+    """
+    Hit/miss counters of the projection cache (staff only)
+    """
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get(self, request):
+        return JsonResponse(projection_cache.stats())
+
+
+class RatesBreakerStatsView(UserPassesTestMixin, View):
+    """
+    State and timing of the Central Bank API circuit breaker (staff only)
+    """
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get(self, request):
+        return JsonResponse(bcb_breaker.stats())
+
+
+class _Echo:
+    """
+    File-like object that hands csv.writer rows back to the generator
+    """
+
+    def write(self, value):
+        return value
+
+
+SCHEDULE_COLUMNS = ('investment', 'title', 'date', 'monthly_income', 'total_value')
+
+
+def stream_schedules(investments, fmt):
+    """Gera as linhas das tabelas mensais em CSV ou JSON lines
+    """
+    if fmt == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(SCHEDULE_COLUMNS)
+    for investment in investments:
+        for row in iter_schedule(investment):
+            values = (investment.pk, investment.title, row.date.isoformat(),
+                      row.monthly_income, row.total_value)
+            if fmt == 'csv':
+                yield writer.writerow(values)
             else:
-                variable_return = Decimal('0.00')
+                # Same encoding as the JSON schedule API: Decimals as strings
+                yield json.dumps(dict(zip(SCHEDULE_COLUMNS, values)),
+                                 cls=DjangoJSONEncoder) + '\n'
 
-            total_monthly_income = fixed_return + variable_return + getattr(
-                investment, 'additional_contribution', Decimal('0.00'))
-            total_amount += total_monthly_income
 
-            months.append({
-                'date': current_date,
-                'monthly_income': round(total_monthly_income, 2),
-                'total_value': round(total_amount, 2),
-            })
+class ScheduleExportView(LoginRequiredMixin, View):
+    """
+    Streams the monthly schedule of one investment, or of all the user's
+    investments one after another, as CSV or JSON lines
+    """
+    content_types = {
+        'csv': 'text/csv',
+        'jsonl': 'application/jsonl',
+    }
+
+    def get(self, request, fmt, pk=None):
+        if fmt not in self.content_types:
+            raise Http404
+        investments = Investment.objects.filter(user=request.user)
+        if pk is not None:
+            investments = [get_object_or_404(investments, pk=pk)]
+            filename = f'investment-{pk}-schedule.{fmt}'
+        else:
+            investments = investments.order_by('pk').iterator()
+            filename = f'portfolio-schedule.{fmt}'
+
+        response = StreamingHttpResponse(
+            stream_schedules(investments, fmt),
+            content_type=self.content_types[fmt])
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+class QueryInvestmentMixin:
+    """
+    Reads the user's investment given by ?investment=<pk>
+    """
 
-            if current_date.month >= 12:
-                current_date = current_date.replace(
-                    year=current_date.year + 1, month=1)
+    def get_query_investment(self):
+        """
+        Investimento indicado na query string, ou None se não informado.
+        A pk that is not an integer is a missing page, not a server error.
+        """
+        investment_id = self.request.GET.get('investment')
+        if not investment_id:
+            return None
+        try:
+            investment_id = int(investment_id)
+        except ValueError as error:
+            raise Http404('Invalid investment.') from error
+        return get_object_or_404(
+            Investment, pk=investment_id, user=self.request.user)
+
+
+class GoalSeekView(LoginRequiredMixin, QueryInvestmentMixin, FormView):
+    """
+    Solves the contribution, horizon or rate needed to reach a target value,
+    optionally starting from one of the user's investments (?investment=pk)
+    """
+    template_name = 'base/goal_seek.html'
+    form_class = GoalSeekForm
+
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        investment = self.get_query_investment()
+        if investment:
+            kwargs['instance'] = investment
+        return kwargs
+
+    def form_valid(self, form):
+        result = form.solve()
+        if result is None:
+            return self.form_invalid(form)
+        return self.render_to_response(
+            self.get_context_data(form=form, result=result))
+
+
+class GoalSeekApiView(LoginRequiredMixin, View):
+    """
+    JSON version of GoalSeekView, accepting the same fields by GET or POST
+    """
+
+    def get(self, request):
+        return self.solve(request.GET)
+
+    def post(self, request):
+        return self.solve(request.POST)
+
+    def solve(self, data):
+        form = GoalSeekForm(data)
+        result = form.solve() if form.is_valid() else None
+        if result is None:
+            return JsonResponse({'errors': form.errors}, status=400)
+        return JsonResponse(result)
+
+
+class InvestmentBacktestView(LoginRequiredMixin, View):
+    """
+    Realised vs projected balance using the stored CDI/SELIC history
+    """
+
+    def get(self, request, pk):
+        investment = get_object_or_404(Investment, pk=pk, user=request.user)
+        result = backtest(investment, get_rate_index(investment.rate_type))
+        return JsonResponse({'series': investment.rate_type, **result})
+
+
+class RateLookupView(LoginRequiredMixin, View):
+    """
+    Rate of a series on ?date=YYYY-MM-DD and/or its accumulated factor
+    over [?start, ?end)
+    """
+
+    def get(self, request, series):
+        index = get_rate_index(series)
+        if index is None:
+            return JsonResponse({'error': 'Unknown series.'}, status=404)
+        try:
+            dates = {key: datetime.strptime(request.GET[key], '%Y-%m-%d').date()
+                     for key in ('date', 'start', 'end') if key in request.GET}
+        except ValueError:
+            return JsonResponse({'error': 'Dates must be YYYY-MM-DD.'}, status=400)
+
+        result = {'series': series, 'first_date': index.first_date,
+                  'last_date': index.last_date}
+        if 'date' in dates:
+            result['date'] = dates['date']
+            result['rate'] = index.rate_on(dates['date']) if len(index) else None
+        if 'start' in dates and 'end' in dates:
+            result['factor'] = float(index.factor_between(
+                dates['start'], dates['end'])) if len(index) else None
+        return JsonResponse(result)
+
+
+class ImportView(LoginRequiredMixin, FormView):
+    """
+    Upload of a CSV or OFX file with many investments, incomes or expenses
+    """
+    form_class = ImportForm
+    template_name = 'base/import.html'
+
+    def form_valid(self, form):
+        upload = form.cleaned_data['file']
+        stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig',
+                                  errors='replace', newline='')
+        result = import_rows(self.request.user, stream, format_for(upload.name),
+                             form.cleaned_data['kind'] or None)
+        return self.render_to_response(self.get_context_data(
+            form=ImportForm(), result=result))
+
+
+class BulkActionView(LoginRequiredMixin, View):
+    """
+    One action (bulk.BULK_ACTIONS) over the rows checked in a list view;
+    POST with action, ids, and tags or percent when needed
+    """
+    list_urls = {
+        'investment': 'investments',
+        'income': 'income-list',
+        'expense': 'expense-list',
+    }
+
+    def post(self, request, kind):
+        if kind not in bulk.BULK_KINDS:
+            raise Http404
+        action = request.POST.get('action')
+        ids = request.POST.getlist('ids')
+        tags = request.POST.getlist('tags')
+        try:
+            ids = [int(pk) for pk in ids]
+            tags = [int(pk) for pk in tags]
+            if action in ('activate', 'deactivate') and kind == 'investment':
+                bulk.set_active(request.user, ids, action == 'activate')
+            elif action == 'add_tags':
+                bulk.add_tags(request.user, kind, ids, tags)
+            elif action == 'remove_tags':
+                bulk.remove_tags(request.user, kind, ids, tags)
+            elif action == 'adjust_amount':
+                bulk.adjust_amount(request.user, kind, ids,
+                                   request.POST.get('percent', ''))
+            elif action == 'delete':
+                bulk.delete(request.user, kind, ids)
             else:
-                current_date = current_date.replace(
-                    month=current_date.month + 1)
+                return JsonResponse({'error': 'Unknown action.'}, status=400)
+        except (ValueError, ArithmeticError):
+            return JsonResponse({'error': 'Invalid ids, tags or percent.'},
+                                status=400)
+        return redirect(self.list_urls[kind])
 
-        context['months'] = months
-        context['total_result'] = round(total_amount, 2)
 
-        return context
+class SearchView(LoginRequiredMixin, View):
+    """
+    Ranked search over the user's investments, incomes and expenses by
+    title and tag (?q=, optional ?kind= repeated and ?limit=)
+    """
+    max_limit = 100
+    detail_urls = {
+        'investment': 'investment',
+        'income': 'income-update',
+        'expense': 'expense-update',
+    }
+
+    def get(self, request):
+        try:
+            limit = min(max(int(request.GET.get('limit', 20)), 1), self.max_limit)
+        except ValueError:
+            return JsonResponse({'error': 'limit must be an integer.'}, status=400)
+        results = search(request.user, request.GET.get('q', ''),
+                         request.GET.getlist('kind') or None, limit)
+        for result in results:
+            result['url'] = reverse(self.detail_urls[result['kind']],
+                                    args=[result['id']])
+        return JsonResponse({'results': results})
+
+
+class SearchAutocompleteView(LoginRequiredMixin, View):
+    """
+    Title and tag suggestions for the text typed so far (?q=)
+    """
+
+    def get(self, request):
+        return JsonResponse({'suggestions': autocomplete(
+            request.user, request.GET.get('q', ''))})
+
+
+class SweepView(LoginRequiredMixin, QueryInvestmentMixin, View):
+    """
+    What-if grid of final values. Each parameter in SWEEP_FIELDS may be
+    given as start:stop:step (inclusive) or as a comma separated list; the
+    other parameters come from ?investment=<pk>.
+    Scenarios whose value overflows a float are returned as null.
+    Nothing is saved to the database.
+    """
+    max_cells = 100000
+
+    def get(self, request):
+        investment = self.get_query_investment() or Investment()
+
+        try:
+            axes = {field: self.parse_axis(request.GET[field])
+                    for field in SWEEP_FIELDS if request.GET.get(field)}
+        except (ArithmeticError, ValueError):
+            return JsonResponse(
+                {'error': 'Use start:stop:step or comma separated numbers.'},
+                status=400)
+        if not axes:
+            return JsonResponse(
+                {'error': f"Give a range for one of {', '.join(SWEEP_FIELDS)}."},
+                status=400)
+        cells = 1
+        for values in axes.values():
+            cells *= len(values)
+        if cells > self.max_cells:
+            return JsonResponse(
+                {'error': f'The grid is limited to {self.max_cells} scenarios.'},
+                status=400)
+
+        return JsonResponse({
+            'axes': {field: [float(value) for value in values]
+                     for field, values in axes.items()},
+            'values': finite_or_none(sweep(investment, axes)).tolist(),
+        })
+
+    def parse_axis(self, text):
+        """Converte 'start:stop:step' ou 'a,b,c' numa lista de Decimal
+        """
+        if ':' in text:
+            start, stop, step = (Decimal(part) for part in text.split(':'))
+            count = int((stop - start) / step) + 1
+            if not 0 < count <= self.max_cells:
+                raise ValueError(text)
+            values = [start + step * i for i in range(count)]
+        else:
+            values = [Decimal(part) for part in text.split(',')]
+        # NaN, Infinity or values past the float range have no JSON form
+        if not all(math.isfinite(float(value)) for value in values):
+            raise ValueError(text)
+        return values
 
 
 class InvestmentCreate(LoginRequiredMixin, CreateView):
@@ -188,23 +596,26 @@ class InvestmentDelete(LoginRequiredMixin, DeleteView):
     success_url = reverse_lazy('investments')
 
 
-class IncomeList(LoginRequiredMixin, ListView):
+class IncomeList(LoginRequiredMixin, BulkActionsMixin, KeysetPaginationMixin,
+                 ListView):
     """
     Main View: list of incomes 
     """
     model = Income
     context_object_name = 'incomes'
+    ordering_keys = ('id',)
+    bulk_kind = 'income'
 
     def get_queryset(self):
-        return Income.objects.filter(user=self.request.user)
+        queryset = Income.objects.filter(user=self.request.user)
+        search_input = self.request.GET.get('search_box') or ''
+        if search_input:
+            queryset = filter_queryset(queryset, self.request.user, search_input)
+        return queryset
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        search_input = self.request.GET.get('search_box') or ''
-        if search_input:
-            context['incomes'] = context['incomes'].filter(
-                title__startswith=search_input)
-        context['search_input'] = search_input
+        context['search_input'] = self.request.GET.get('search_box') or ''
 
         return context
 
@@ -245,23 +656,26 @@ class IncomeDelete(LoginRequiredMixin, DeleteView):
     success_url = reverse_lazy('income-list')
 
 
-class ExpenseList(LoginRequiredMixin, ListView):
+class ExpenseList(LoginRequiredMixin, BulkActionsMixin, KeysetPaginationMixin,
+                  ListView):
     """
     Main View: list of expenses 
     """
     model = Expense
     context_object_name = 'expenses'
+    ordering_keys = ('id',)
+    bulk_kind = 'expense'
 
     def get_queryset(self):
-        return Expense.objects.filter(user=self.request.user)
+        queryset = Expense.objects.filter(user=self.request.user)
+        search_input = self.request.GET.get('search_box') or ''
+        if search_input:
+            queryset = filter_queryset(queryset, self.request.user, search_input)
+        return queryset
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        search_input = self.request.GET.get('search_box') or ''
-        if search_input:
-            context['expenses'] = context['expenses'].filter(
-                title__startswith=search_input)
-        context['search_input'] = search_input
+        context['search_input'] = self.request.GET.get('search_box') or ''
 
         return context
 
@@ -395,9 +809,9 @@ class InvestmentRatesView(View):
 
 def UserDataView(request):
     user = request.user
-    customer_data = get_user_data(user)
+    customer_data = get_user_data_json(user).decode()
 
-    return render(request, 'base/summarize.html', {'customer_data': json.dumps(customer_data, indent=4)})
+    return render(request, 'base/summarize.html', {'customer_data': customer_data})
 
 
 groq_strategy = GROQChatModelStrategy()
@@ -405,7 +819,7 @@ gpt4all_strategy = GPT4AllChatModelStrategy()
 
 
 def chat_with_assistant(message, user, model_name):
-    json_data = get_user_data(user)
+    json_data = get_user_data_json(user).decode()
     try:
         if model_name == "gpt4all":
             bot_response = gpt4all_strategy.get_response(message, json_data)
@@ -427,16 +841,20 @@ def chatbot_view(request):
 
 
 def notifications_view(request):
-    notifications_unread = Notification.objects.filter(
-        user=request.user, is_read=False).order_by('-date_created')
-
-    notifications_read = Notification.objects.filter(
-        user=request.user, is_read=True).order_by('-date_created')
-
-    return render(request, 'base/notifications.html', {
-        'notifications_unread': notifications_unread,
-        'notifications_read': notifications_read
-    })
+    page_size = 50
+    ordering = ('-date_created', '-id')
+    context = {}
+    for state, is_read in (('unread', False), ('read', True)):
+        paginator = KeysetPaginator(Notification.objects.filter(
+            user=request.user, is_read=is_read), ordering, page_size)
+        try:
+            rows, next_cursor = paginator.page(request.GET.get(f'{state}_cursor'))
+        except InvalidCursor:
+            rows, next_cursor = paginator.page()
+        context[f'notifications_{state}'] = rows
+        context[f'{state}_cursor'] = next_cursor
+
+    return render(request, 'base/notifications.html', context)
 
 
 def mark_as_read(request, notification_id):
@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import sys
 from pathlib import Path
 
+from decouple import config
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -122,6 +125,45 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Cache shared by every worker: 'file' (default), 'database' (run
+# createcachetable), 'redis' or 'memcached' (CACHE_LOCATION is the server URL
+# and needs redis/pymemcache installed) or 'locmem' for a single process.
+# Background simulation jobs are kept here too, so with several workers the
+# polls only find their job on a shared backend.
+# Keys are prefixed and versioned; bump CACHE_VERSION to drop old entries.
+# 'file' has no atomic incr (it is a get and a set), so invalidation replaces
+# version keys with new values instead of incrementing them.
+
+CACHE_BACKENDS = {
+    'file': ('django.core.cache.backends.filebased.FileBasedCache',
+             str(BASE_DIR / 'cache')),
+    'database': ('django.core.cache.backends.db.DatabaseCache', 'cache_table'),
+    'redis': ('django.core.cache.backends.redis.RedisCache',
+              'redis://127.0.0.1:6379'),
+    'memcached': ('django.core.cache.backends.memcached.PyMemcacheCache',
+                  '127.0.0.1:11211'),
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'invest_planner'),
+}
+CACHE_BACKEND = config('CACHE_BACKEND', default='file')
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND][0],
+        'LOCATION': config('CACHE_LOCATION',
+                           default=CACHE_BACKENDS[CACHE_BACKEND][1]),
+        'KEY_PREFIX': 'invest_planner',
+        'VERSION': config('CACHE_VERSION', default=1, cast=int),
+        'TIMEOUT': 300,
+    }
+}
+
+# Tests get a private in-memory cache, so their cache.clear() calls never
+# wipe the cache of the development server
+if sys.argv[1:2] == ['test']:
+    CACHES['default'].update(BACKEND=CACHE_BACKENDS['locmem'][0],
+                             LOCATION='invest_planner-tests')
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
 
@@ -152,6 +194,27 @@ ACCOUNT_LOGOUT_REDIRECT_URL = '/accounts/login/'
 
 ACCOUNT_EMAIL_REQUIRED = 'true'
 
+# Arithmetic used for projections: 'float' (NumPy, checked against Decimal
+# near rounding ties) or 'decimal'
+PROJECTION_BACKEND = 'float'
+
+# Central Bank SGS endpoint; {code} is replaced by the series number
+BCB_SGS_URL = "https://api.bcb.gov.br/dados/serie/bcdata.sgs.{code}/dados"
+# (connect, read) timeouts of each SGS request, in seconds
+BCB_SGS_TIMEOUT = (5, 20)
+
+# Rates are served from the local table; after RATES_SOFT_TTL seconds
+# without a sync they are refreshed in the background, and observations
+# older than RATES_HARD_TTL seconds are reported as unavailable
+RATES_SOFT_TTL = 6 * 3600
+RATES_HARD_TTL = 7 * 86400
+RATES_BACKGROUND_REFRESH = True
+
+# Circuit breaker around the SGS API: open after this many consecutive
+# failures and probe again after BCB_BREAKER_RESET seconds
+BCB_BREAKER_FAILURES = 3
+BCB_BREAKER_RESET = 30
+
 GRAPH_MODELS = {
     'app_labels': ["base", "auth"],
 }